@@ -64,3 +64,135 @@ class BaseAgent:
         Returns:
             The response (or answer) to the message.
         """
+
+
+class BaseBatchAgent:
+    """Implements an agent acting in a batch of environment copies at once.
+    Note:
+        agent_init, agent_start, agent_step, agent_cleanup, and agent_message
+        are required methods. Observations, rewards and actions are arrays
+        with one entry per environment copy.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        pass
+
+    @abstractmethod
+    def agent_init(self, agent_info= {}):
+        """Setup for the agent called when the experiment first starts.
+        agent_info["num_envs"] holds the number of environment copies."""
+
+    @abstractmethod
+    def agent_start(self, observations):
+        """The first method called when the experiment starts, called after
+        the environment starts.
+        Args:
+            observations (Numpy array): the first state observation of every copy.
+        Returns:
+            Numpy array: the first action taken in every copy.
+        """
+
+    @abstractmethod
+    def agent_step(self, rewards, observations, terminals):
+        """A step taken by the agent in every copy.
+        Args:
+            rewards (Numpy array): the reward received in each copy for the
+                last action taken
+            observations (Numpy array): the state observation of each copy
+                after the last step. Where terminals is True the copy has
+                already been restarted and this is the first observation of
+                its next episode.
+            terminals (Numpy array): booleans marking the copies whose episode
+                ended with the last step, rewards holds their final reward
+        Returns:
+            Numpy array: the action taken in every copy.
+        """
+
+    @abstractmethod
+    def agent_cleanup(self):
+        """Cleanup done after the agent ends."""
+
+    @abstractmethod
+    def agent_message(self, message):
+        """A function used to pass information from the agent to the experiment.
+        Args:
+            message: The message passed to the agent.
+        Returns:
+            The response (or answer) to the message.
+        """
+
+
+class AsyncBaseAgent:
+    """Implements an agent whose methods are coroutines.
+    Note:
+        agent_init, agent_start, agent_step, agent_end, agent_cleanup, and
+        agent_message are required coroutines with the arguments and results
+        of BaseAgent.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    async def agent_init(self, agent_info= {}):
+        """Setup for the agent called when the experiment first starts."""
+
+    @abstractmethod
+    async def agent_start(self, observation):
+        """The first method called when the experiment starts, called after
+        the environment starts.
+        Returns:
+            The first action the agent takes.
+        """
+
+    @abstractmethod
+    async def agent_step(self, reward, observation):
+        """A step taken by the agent.
+        Returns:
+            The action the agent is taking.
+        """
+
+    @abstractmethod
+    async def agent_end(self, reward):
+        """Run when the agent terminates."""
+
+    @abstractmethod
+    async def agent_cleanup(self):
+        """Cleanup done after the agent ends."""
+
+    @abstractmethod
+    async def agent_message(self, message):
+        """A function used to pass information from the agent to the experiment.
+        Returns:
+            The response (or answer) to the message.
+        """
+
+
+class AsyncAgentAdapter(AsyncBaseAgent):
+    """Runs a synchronous BaseAgent behind the AsyncBaseAgent API.
+    Note:
+        Agents usually only compute, so the calls run directly on the event
+        loop.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    async def agent_init(self, agent_info= {}):
+        return self.agent.agent_init(agent_info)
+
+    async def agent_start(self, observation):
+        return self.agent.agent_start(observation)
+
+    async def agent_step(self, reward, observation):
+        return self.agent.agent_step(reward, observation)
+
+    async def agent_end(self, reward):
+        return self.agent.agent_end(reward)
+
+    async def agent_cleanup(self):
+        return self.agent.agent_cleanup()
+
+    async def agent_message(self, message):
+        return self.agent.agent_message(message)
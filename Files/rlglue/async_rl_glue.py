@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""Glues together an experiment, agent, and environment on an asyncio event
+loop.
+"""
+
+from __future__ import print_function
+
+import asyncio
+import inspect
+
+import numpy as np
+
+from .agent import AsyncAgentAdapter
+from .environment import AsyncEnvironmentAdapter
+
+
+class AsyncRLGlue:
+    """AsyncRLGlue class
+
+    Coroutine counterpart of RLGlue. While one experiment waits for its
+    environment, others on the same event loop keep running.
+
+    Classes whose env_step or agent_step are plain functions are wrapped in
+    AsyncEnvironmentAdapter and AsyncAgentAdapter, so synchronous
+    BaseEnvironment and BaseAgent subclasses work unchanged.
+
+    args:
+        env_class: an AsyncBaseEnvironment or BaseEnvironment subclass
+        agent_class: an AsyncBaseAgent or BaseAgent subclass
+        env_in_executor (Boolean): run a synchronous environment in the
+            default executor, see AsyncEnvironmentAdapter
+    """
+
+    def __init__(self, env_class, agent_class, env_in_executor=False):
+        self.environment = env_class()
+        if not inspect.iscoroutinefunction(self.environment.env_step):
+            self.environment = AsyncEnvironmentAdapter(self.environment,
+                                                       env_in_executor)
+        self.agent = agent_class()
+        if not inspect.iscoroutinefunction(self.agent.agent_step):
+            self.agent = AsyncAgentAdapter(self.agent)
+
+        self.total_reward = None
+        self.last_action = None
+        self.num_steps = None
+        self.num_episodes = None
+
+    async def rl_init(self, agent_init_info={}, env_init_info={}):
+        """Initial method called when AsyncRLGlue experiment is created"""
+        await self.environment.env_init(env_init_info)
+        await self.agent.agent_init(agent_init_info)
+
+        self.total_reward = 0.0
+        self.num_steps = 0
+        self.num_episodes = 0
+
+    async def rl_start(self):
+        """Starts AsyncRLGlue experiment
+
+        Returns:
+            tuple: (state, action)
+        """
+        self.total_reward = 0.0
+        self.num_steps = 1
+
+        last_state = await self.environment.env_start()
+        self.last_action = await self.agent.agent_start(last_state)
+
+        observation = (last_state, self.last_action)
+
+        return observation
+
+    async def rl_step(self):
+        """Step taken by AsyncRLGlue, takes environment step and either step
+            or end by agent.
+
+        Returns:
+            (float, state, action, Boolean): reward, last state observation,
+                last action, boolean indicating termination
+        """
+        (reward, last_state,
+         term) = await self.environment.env_step(self.last_action)
+
+        self.total_reward += reward
+
+        if term:
+            self.num_episodes += 1
+            await self.agent.agent_end(reward)
+            roat = (reward, last_state, None, term)
+        else:
+            self.num_steps += 1
+            self.last_action = await self.agent.agent_step(reward, last_state)
+            roat = (reward, last_state, self.last_action, term)
+
+        return roat
+
+    async def rl_episode(self, max_steps_this_episode):
+        """Runs an AsyncRLGlue episode
+
+        Args:
+            max_steps_this_episode (Int): the maximum steps for the experiment to run in an episode
+
+        Returns:
+            Boolean: if the episode should terminate
+        """
+        is_terminal = False
+
+        await self.rl_start()
+
+        while (not is_terminal) and ((max_steps_this_episode == 0) or
+                                     (self.num_steps < max_steps_this_episode)):
+            rl_step_result = await self.rl_step()
+            is_terminal = rl_step_result[3]
+
+        return is_terminal
+
+    async def rl_cleanup(self):
+        """Cleanup done at end of experiment."""
+        await self.environment.env_cleanup()
+        await self.agent.agent_cleanup()
+
+    async def rl_agent_message(self, message):
+        """Message passed to communicate with agent during experiment
+
+        Args:
+            message: the message (or question) to send to the agent
+
+        Returns:
+            The message back (or answer) from the agent
+
+        """
+        return await self.agent.agent_message(message)
+
+    async def rl_env_message(self, message):
+        """Message passed to communicate with environment during experiment
+
+        Args:
+            message: the message (or question) to send to the environment
+
+        Returns:
+            The message back (or answer) from the environment
+
+        """
+        return await self.environment.env_message(message)
+
+    def rl_return(self):
+        """The total reward
+
+        Returns:
+            float: the total reward
+        """
+        return self.total_reward
+
+    def rl_num_steps(self):
+        """The total number of steps taken
+
+        Returns:
+            Int: the total number of steps taken
+        """
+        return self.num_steps
+
+    def rl_num_episodes(self):
+        """The number of episodes
+
+        Returns
+            Int: the total number of episodes
+
+        """
+        return self.num_episodes
+
+
+async def rl_concurrent_episodes(env_class,
+                                 agent_class,
+                                 num_runs,
+                                 num_episodes,
+                                 max_steps_this_episode=0,
+                                 agent_info={},
+                                 env_info={},
+                                 env_in_executor=False):
+    """Runs num_runs independent experiments of num_episodes episodes each
+    concurrently on the running event loop
+
+    Returns:
+        (Numpy array, Numpy array): the return and number of steps of every
+            episode, with shape (num_runs, num_episodes)
+    """
+    returns = np.zeros((num_runs, num_episodes))
+    steps = np.zeros((num_runs, num_episodes), dtype=int)
+
+    async def run(i):
+        rl_glue = AsyncRLGlue(env_class, agent_class, env_in_executor)
+        await rl_glue.rl_init(agent_info, env_info)
+        for episode in range(num_episodes):
+            await rl_glue.rl_episode(max_steps_this_episode)
+            returns[i, episode] = rl_glue.rl_return()
+            steps[i, episode] = rl_glue.rl_num_steps()
+        await rl_glue.rl_cleanup()
+
+    await asyncio.gather(*(run(i) for i in range(num_runs)))
+    return returns, steps
@@ -5,6 +5,7 @@
 
 from __future__ import print_function
 
+import asyncio
 from abc import ABCMeta, abstractmethod
 
 
@@ -68,3 +69,163 @@ class BaseEnvironment:
         Returns:
             the response (or answer) to the message
         """
+
+
+class BaseBatchEnvironment:
+    """Implements a batch of copies of an environment that step in lockstep
+
+    Note:
+        env_init, env_start, env_step, env_reset, env_cleanup, and env_message
+        are required methods. Observations, rewards and terminals are arrays
+        with one entry per copy.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        self.num_envs = None
+
+    @abstractmethod
+    def env_init(self, env_info={}):
+        """Setup for the environment called when the experiment first starts.
+
+        Note:
+            env_info["num_envs"] holds the number of copies to simulate.
+        """
+
+    @abstractmethod
+    def env_start(self):
+        """The first method called when the experiment starts, called before the
+        agent starts.
+
+        Returns:
+            Numpy array: the first state observation of every copy.
+        """
+
+    @abstractmethod
+    def env_step(self, actions):
+        """A step taken by every copy of the environment.
+
+        Args:
+            actions (Numpy array): the action taken in each copy
+
+        Returns:
+            (Numpy array, Numpy array, Numpy array): the rewards, state
+                observations, and booleans indicating which copies reached a
+                terminal state.
+        """
+
+    @abstractmethod
+    def env_reset(self, mask):
+        """Starts a new episode in the copies that finished.
+
+        Args:
+            mask (Numpy array): booleans selecting the copies to restart
+
+        Returns:
+            Numpy array: the first state observation of each restarted copy,
+                in the order of the copies selected by mask.
+        """
+
+    @abstractmethod
+    def env_cleanup(self):
+        """Cleanup done after the environment ends"""
+
+    @abstractmethod
+    def env_message(self, message):
+        """A message asking the environment for information
+
+        Args:
+            message: the message passed to the environment
+
+        Returns:
+            the response (or answer) to the message
+        """
+
+
+class AsyncBaseEnvironment:
+    """Implements an environment whose methods are coroutines, for example one
+    that talks to a simulator process or a local socket
+
+    Note:
+        env_init, env_start, env_step, env_cleanup, and env_message are required
+        coroutines with the arguments and results of BaseEnvironment.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    async def env_init(self, env_info={}):
+        """Setup for the environment called when the experiment first starts."""
+
+    @abstractmethod
+    async def env_start(self):
+        """The first method called when the experiment starts, called before the
+        agent starts.
+
+        Returns:
+            The first state observation from the environment.
+        """
+
+    @abstractmethod
+    async def env_step(self, action):
+        """A step taken by the environment.
+
+        Args:
+            action: The action taken by the agent
+
+        Returns:
+            (float, state, Boolean): a tuple of the reward, state observation,
+                and boolean indicating if it's terminal.
+        """
+
+    @abstractmethod
+    async def env_cleanup(self):
+        """Cleanup done after the environment ends"""
+
+    @abstractmethod
+    async def env_message(self, message):
+        """A message asking the environment for information
+
+        Args:
+            message: the message passed to the environment
+
+        Returns:
+            the response (or answer) to the message
+        """
+
+
+class AsyncEnvironmentAdapter(AsyncBaseEnvironment):
+    """Runs a synchronous BaseEnvironment behind the AsyncBaseEnvironment API
+
+    Note:
+        With in_executor the calls run in the event loop's default executor, so
+        an environment that blocks (e.g. on a socket) does not stall other
+        episodes. Otherwise they run directly, which is faster for
+        environments that only compute.
+    """
+
+    def __init__(self, environment, in_executor=False):
+        self.environment = environment
+        self.in_executor = in_executor
+
+    async def call(self, method, *args):
+        if not self.in_executor:
+            return method(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, method, *args)
+
+    async def env_init(self, env_info={}):
+        return await self.call(self.environment.env_init, env_info)
+
+    async def env_start(self):
+        return await self.call(self.environment.env_start)
+
+    async def env_step(self, action):
+        return await self.call(self.environment.env_step, action)
+
+    async def env_cleanup(self):
+        return await self.call(self.environment.env_cleanup)
+
+    async def env_message(self, message):
+        return await self.call(self.environment.env_message, message)
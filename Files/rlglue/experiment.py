@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""Runs independent RL-Glue experiments for many seeds in parallel.
+"""
+
+from __future__ import print_function
+
+import multiprocessing as mp
+
+import numpy as np
+
+from .rl_glue import RLGlue
+
+
+class RunningStats:
+    """RunningStats class
+
+    Mean and variance of equally shaped arrays, updated one array at a time
+    with Welford's algorithm, so the arrays themselves are never stored.
+
+    args:
+        shape (tuple): the shape of every array
+    """
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, values):
+        """Adds one array to the statistics
+
+        Args:
+            values (Numpy array): an array of the given shape
+        """
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    @property
+    def variance(self):
+        """The sample variance of every entry, NaN until two arrays were added"""
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def standard_error(self):
+        """The standard error of every entry of the mean"""
+        return np.sqrt(self.variance / self.count)
+
+
+def seed_streams(seed):
+    """Splits seed into independent seeds for the environment, the agent and
+    the global NumPy random state of one run
+
+    Args:
+        seed (Int or SeedSequence): the seed of the run
+
+    Returns:
+        (Int, Int, Int): environment, agent and global seed
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return tuple(int(child.generate_state(1)[0]) for child in seed.spawn(3))
+
+
+def run_seed(env_class, agent_class, seed, num_episodes,
+             max_steps_this_episode, agent_info, env_info):
+    """Runs one experiment
+
+    The environment and the agent receive their own seed as env_info["seed"]
+    and agent_info["seed"]. Code using the global NumPy random state is seeded
+    with a third stream, the caller's global state is restored afterwards.
+
+    Returns:
+        (Numpy array, Numpy array): the return and number of steps of every
+            episode
+    """
+    env_seed, agent_seed, global_seed = seed_streams(seed)
+    global_state = np.random.get_state()
+    np.random.seed(global_seed)
+    try:
+        rl_glue = RLGlue(env_class, agent_class)
+        rl_glue.rl_init(dict(agent_info, seed=agent_seed),
+                        dict(env_info, seed=env_seed))
+        returns = np.zeros(num_episodes)
+        steps = np.zeros(num_episodes, dtype=int)
+        for episode in range(num_episodes):
+            rl_glue.rl_episode(max_steps_this_episode)
+            returns[episode] = rl_glue.rl_return()
+            steps[episode] = rl_glue.rl_num_steps()
+        rl_glue.rl_cleanup()
+    finally:
+        np.random.set_state(global_state)
+    return returns, steps
+
+
+def _run_task(task):
+    return run_seed(*task)
+
+
+def run_experiment(env_class,
+                   agent_class,
+                   seeds,
+                   num_episodes,
+                   max_steps_this_episode=0,
+                   agent_info={},
+                   env_info={},
+                   processes=None):
+    """Runs one RLGlue experiment per seed in a pool of processes
+
+    Runs finish in any order and are folded into the statistics as they
+    arrive, so memory does not grow with the number of seeds.
+
+    Args:
+        env_class: a BaseEnvironment subclass, importable by the workers
+        agent_class: a BaseAgent subclass, importable by the workers
+        seeds (list): one seed (Int or SeedSequence) per run
+        num_episodes (Int): the number of episodes of every run
+        max_steps_this_episode (Int): the step limit of an episode, 0 for none
+        agent_info (dict): passed to agent_init, with the run's seed added
+        env_info (dict): passed to env_init, with the run's seed added
+        processes (Int): the number of worker processes, all cores by
+            default, 1 runs every seed in this process
+
+    Returns:
+        dict: RunningStats of the per-episode "returns" and "steps" over the
+            runs
+    """
+    stats = {
+        "returns": RunningStats(num_episodes),
+        "steps": RunningStats(num_episodes),
+    }
+    tasks = [(env_class, agent_class, seed, num_episodes,
+              max_steps_this_episode, agent_info, env_info) for seed in seeds]
+    if processes == 1:
+        results = map(_run_task, tasks)
+        pool = None
+    else:
+        pool = mp.Pool(processes)
+        results = pool.imap_unordered(_run_task, tasks)
+    try:
+        for returns, steps in results:
+            stats["returns"].update(returns)
+            stats["steps"].update(steps)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return stats
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+"""Records RL-Glue trajectories into an append-only file on disk.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+
+def transition_dtype(state_dtype=np.int64,
+                     state_shape=(),
+                     action_dtype=np.int64,
+                     reward_dtype=np.float64):
+    """The record layout of one transition
+
+    Returns:
+        Numpy dtype: fields state, action, reward, next_state and terminal
+    """
+    return np.dtype([('state', state_dtype, state_shape),
+                     ('action', action_dtype),
+                     ('reward', reward_dtype),
+                     ('next_state', state_dtype, state_shape),
+                     ('terminal', np.bool_)])
+
+
+def _dtype_path(path):
+    return path + '.dtype.json'
+
+
+def _read_dtype(path):
+    with open(_dtype_path(path)) as f:
+        meta = json.load(f)
+    if meta['version'] != 1:
+        raise ValueError('Unsupported trajectory version {}'.format(
+            meta['version']))
+    return np.dtype([tuple(field[:2]) + tuple(tuple(s) for s in field[2:])
+                     for field in meta['descr']])
+
+
+def load_trajectories(path, mode='r'):
+    """Maps a file written by TrajectoryRecorder without reading it
+
+    Args:
+        path (string): the file given to TrajectoryRecorder
+        mode (string): the np.memmap mode, read only by default
+
+    Returns:
+        Numpy memmap: one record per transition, see transition_dtype
+    """
+    dtype = _read_dtype(path)
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(count, ))
+
+
+class TrajectoryRecorder:
+    """TrajectoryRecorder class
+
+    Stores transitions in a preallocated record array and appends it to path
+    every chunk_size transitions, so memory stays constant however long the
+    run is. The record layout is written next to the data in path.dtype.json.
+    Recording into an existing file appends to it.
+
+    Terminal transitions have no next action, their action is the one that
+    led to the terminal state.
+
+    args:
+        path (string): the data file
+        chunk_size (Int): the number of transitions held in memory
+        the remaining arguments are passed to transition_dtype
+    """
+
+    def __init__(self,
+                 path,
+                 chunk_size=65536,
+                 state_dtype=np.int64,
+                 state_shape=(),
+                 action_dtype=np.int64,
+                 reward_dtype=np.float64):
+        self.path = path
+        self.dtype = transition_dtype(state_dtype, state_shape, action_dtype,
+                                      reward_dtype)
+        if os.path.exists(_dtype_path(path)):
+            if _read_dtype(path) != self.dtype:
+                raise ValueError(
+                    'Existing trajectories in {} have a different dtype'.format(
+                        path))
+        else:
+            with open(_dtype_path(path), 'w') as f:
+                json.dump({'version': 1, 'descr': self.dtype.descr}, f)
+        self.file = open(path, 'ab')
+
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        # Column views of the buffer, filled one row at a time
+        self.states = self.buffer['state']
+        self.actions = self.buffer['action']
+        self.rewards = self.buffer['reward']
+        self.next_states = self.buffer['next_state']
+        self.terminals = self.buffer['terminal']
+        self.size = 0
+        self.num_recorded = 0
+
+        self.rl_glue = None
+        self.last_state = None
+
+    def record(self, state, action, reward, next_state, terminal):
+        """Adds one transition, writing the buffer out when it is full"""
+        i = self.size
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.terminals[i] = terminal
+        self.size = i + 1
+        if self.size == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Appends the buffered transitions to the file"""
+        if self.size:
+            self.file.write(memoryview(self.buffer[:self.size]).cast('B'))
+            self.num_recorded += self.size
+            self.size = 0
+        self.file.flush()
+
+    def attach(self, rl_glue):
+        """Records every step of rl_glue
+
+        rl_start and rl_step are replaced by recording wrappers on the
+        instance, RLGlue itself is unchanged.
+
+        Args:
+            rl_glue (RLGlue): the experiment to record
+        """
+        if self.rl_glue is not None:
+            self.detach()
+        start, step = rl_glue.rl_start, rl_glue.rl_step
+
+        def rl_start(*args, **kwargs):
+            observation = start(*args, **kwargs)
+            self.last_state = observation[0]
+            return observation
+
+        def rl_step():
+            action = rl_glue.last_action
+            roat = step()
+            (reward, next_state, _, terminal) = roat
+            self.record(self.last_state, action, reward, next_state, terminal)
+            self.last_state = next_state
+            return roat
+
+        rl_glue.rl_start = rl_start
+        rl_glue.rl_step = rl_step
+        self.rl_glue = rl_glue
+
+    def detach(self):
+        """Stops recording the attached experiment"""
+        if self.rl_glue is not None:
+            del self.rl_glue.rl_start
+            del self.rl_glue.rl_step
+            self.rl_glue = None
+
+    def close(self):
+        """Detaches, writes the remaining transitions and closes the file"""
+        self.detach()
+        self.flush()
+        self.file.close()
+
+    def __len__(self):
+        return self.num_recorded + self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Run as python -m rlglue.recorder from the Files directory
+    import tempfile
+
+    from .rl_glue import RLGlue
+
+    path = os.path.join(tempfile.mkdtemp(), 'trajectories.bin')
+    transitions = [(s, s % 4, -s / 2, s + 1, s % 10 == 9) for s in range(50)]
+
+    # 50 transitions with 7 per chunk cross several chunk boundaries
+    with TrajectoryRecorder(path, chunk_size=7) as recorder:
+        for transition in transitions:
+            recorder.record(*transition)
+        assert len(recorder) == 50
+    trajectories = load_trajectories(path)
+    assert isinstance(trajectories, np.memmap)
+    assert trajectories.tolist() == transitions
+
+    # Recording into the same file appends
+    with TrajectoryRecorder(path, chunk_size=7) as recorder:
+        recorder.record(*transitions[0])
+    assert load_trajectories(path).tolist() == transitions + transitions[:1]
+
+    try:
+        TrajectoryRecorder(path, reward_dtype=np.float32)
+        assert False, 'a different layout must not append'
+    except ValueError:
+        pass
+
+    class Corridor:
+        def env_init(self, env_info={}):
+            pass
+
+        def env_start(self):
+            self.state = 0
+            return self.state
+
+        def env_step(self, action):
+            self.state += action
+            return (-1.0, self.state, self.state == 3)
+
+        def env_cleanup(self):
+            pass
+
+    class Forward:
+        def agent_init(self, agent_info={}):
+            pass
+
+        def agent_start(self, observation):
+            return 1
+
+        def agent_step(self, reward, observation):
+            return 1
+
+        def agent_end(self, reward):
+            pass
+
+        def agent_cleanup(self):
+            pass
+
+    path = os.path.join(os.path.dirname(path), 'episodes.bin')
+    rl_glue = RLGlue(Corridor, Forward)
+    rl_glue.rl_init()
+    with TrajectoryRecorder(path, chunk_size=4) as recorder:
+        recorder.attach(rl_glue)
+        rl_glue.rl_episode(0)
+        rl_glue.rl_episode(0)
+    assert 'rl_step' not in vars(rl_glue)
+    episode = [(0, 1, -1.0, 1, False), (1, 1, -1.0, 2, False),
+               (2, 1, -1.0, 3, True)]
+    assert load_trajectories(path).tolist() == episode + episode
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""Replay memories for RL-Glue-py agents.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+from .recorder import transition_dtype
+
+
+class ReplayMemory:
+    """ReplayMemory class
+
+    Keeps the last capacity transitions in a circular record array with the
+    layout of rlglue.recorder.transition_dtype. Adding a transition writes one
+    row and never allocates, sampling draws a batch uniformly.
+
+    args:
+        capacity (Int): the largest number of transitions kept
+        seed (Int): the seed of the sampling generator
+        the remaining arguments are passed to transition_dtype
+    """
+
+    def __init__(self,
+                 capacity,
+                 seed=None,
+                 state_dtype=np.int64,
+                 state_shape=(),
+                 action_dtype=np.int64,
+                 reward_dtype=np.float64):
+        self.capacity = capacity
+        self.memory = np.zeros(
+            capacity,
+            dtype=transition_dtype(state_dtype, state_shape, action_dtype,
+                                   reward_dtype))
+        self.states = self.memory['state']
+        self.actions = self.memory['action']
+        self.rewards = self.memory['reward']
+        self.next_states = self.memory['next_state']
+        self.terminals = self.memory['terminal']
+        self.position = 0
+        self.size = 0
+        self.rand_generator = np.random.default_rng(seed)
+
+    def append(self, state, action, reward, next_state, terminal):
+        """Adds a transition, replacing the oldest one when the memory is full
+
+        Returns:
+            Int: the index the transition was stored at
+        """
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.terminals[i] = terminal
+        self.position = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return i
+
+    def sample(self, batch_size):
+        """Draws batch_size transitions uniformly, with replacement
+
+        Returns:
+            (Numpy array, Numpy array): the indices and a record array with
+                fields state, action, reward, next_state and terminal
+        """
+        if self.size == 0:
+            raise ValueError('Cannot sample from an empty replay memory')
+        indices = self.rand_generator.integers(self.size, size=batch_size)
+        return indices, self.memory[indices]
+
+    def __len__(self):
+        return self.size
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """PrioritizedReplayMemory class
+
+    Samples transition i with probability p_i^alpha / sum_k p_k^alpha. The
+    priorities live in a sum tree stored as an array, the root at index 1 and
+    leaf i at index leaves + i. Batches are drawn by descending all levels for
+    the whole batch at once, one level per step.
+
+    New transitions get the largest priority seen so far, so every transition
+    is sampled at least once with high probability.
+
+    args:
+        capacity (Int): the largest number of transitions kept
+        alpha (float): how strongly priorities shape sampling, 0 is uniform
+        epsilon (float): added to every priority so none is zero
+        the remaining arguments are passed to ReplayMemory
+    """
+
+    def __init__(self, capacity, alpha=0.6, epsilon=1e-6, **kwargs):
+        super().__init__(capacity, **kwargs)
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.leaves = 1 << max(capacity - 1, 1).bit_length()
+        self.depth = self.leaves.bit_length() - 1
+        self.levels = np.arange(self.depth + 1)
+        self.tree = np.zeros(2 * self.leaves)
+        self.max_priority = 1.0
+
+    def append(self, state, action, reward, next_state, terminal):
+        """Adds a transition with the largest priority seen so far
+
+        Returns:
+            Int: the index the transition was stored at
+        """
+        i = super().append(state, action, reward, next_state, terminal)
+        node = self.leaves + i
+        change = self.max_priority**self.alpha - self.tree[node]
+        # The leaf and all of its ancestors up to the root
+        self.tree[node >> self.levels] += change
+        return i
+
+    def sample(self, batch_size, beta=0.4):
+        """Draws batch_size transitions in proportion to their priority
+
+        One draw falls into each of batch_size equal slices of the total
+        priority, which lowers the variance of the batch.
+
+        Args:
+            batch_size (Int): the number of transitions
+            beta (float): the importance sampling exponent, 1 fully corrects
+                for the non uniform sampling
+
+        Returns:
+            (Numpy array, Numpy array, Numpy array): the indices, a record
+                array of the transitions and their importance sampling
+                weights, scaled so the largest in the batch is 1
+        """
+        if self.size == 0:
+            raise ValueError('Cannot sample from an empty replay memory')
+        total = self.tree[1]
+        targets = (np.arange(batch_size) +
+                   self.rand_generator.random(batch_size)) * (total /
+                                                              batch_size)
+        nodes = np.ones(batch_size, dtype=np.intp)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            right = targets >= left_sums
+            targets -= np.where(right, left_sums, 0)
+            nodes = left + right
+        # Rounding can step past the last stored transition
+        indices = np.minimum(nodes - self.leaves, self.size - 1)
+
+        probabilities = self.tree[self.leaves + indices] / total
+        weights = (self.size * probabilities)**-beta
+        weights /= weights.max()
+        return indices, self.memory[indices], weights
+
+    def update_priorities(self, indices, priorities):
+        """Sets the priorities of sampled transitions, typically |TD error|
+
+        Args:
+            indices (Numpy array): indices returned by sample
+            priorities (Numpy array): the new priority of each index
+        """
+        priorities = np.abs(priorities) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        nodes = self.leaves + np.asarray(indices)
+        # Repeated indices keep the last priority, as sequential updates would
+        self.tree[nodes] = priorities**self.alpha
+        for _ in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+
+if __name__ == "__main__":
+    # Run as python -m rlglue.replay from the Files directory
+    memory = ReplayMemory(5, seed=0)
+    for s in range(7):
+        assert memory.append(s, s % 4, float(s), s + 1, s == 6) == s % 5
+    assert len(memory) == 5
+    # The two oldest transitions were overwritten in place
+    assert memory.states.tolist() == [5, 6, 2, 3, 4]
+    indices, batch = memory.sample(1000)
+    assert np.array_equal(batch['state'], memory.states[indices])
+    assert set(indices.tolist()) == set(range(5))
+
+    memory = PrioritizedReplayMemory(6, alpha=0.5, epsilon=0, seed=0)
+    assert memory.leaves == 8
+    for s in range(6):
+        memory.append(s, 0, 0.0, s + 1, False)
+    # New transitions share the largest priority, so sampling starts uniform
+    assert memory.tree[1] == 6
+    priorities = np.array([1.0, 4.0, 9.0, 16.0, 0.25, 2.25])
+    memory.update_priorities(np.arange(6), priorities)
+    expected = priorities**0.5 / np.sum(priorities**0.5)
+    # Every internal node is the sum of its children
+    for node in range(1, memory.leaves):
+        assert np.isclose(memory.tree[node],
+                          memory.tree[2 * node] + memory.tree[2 * node + 1])
+    assert np.isclose(memory.tree[1], np.sum(priorities**0.5))
+
+    indices, batch, weights = memory.sample(600000, beta=1.0)
+    frequencies = np.bincount(indices, minlength=6) / len(indices)
+    assert np.allclose(frequencies, expected, atol=1e-3)
+    assert np.array_equal(batch['state'], indices)
+    # With beta = 1 the weights undo the sampling probabilities exactly
+    assert np.allclose(weights, expected.min() / expected[indices])
+
+    # A repeated index keeps its last priority
+    memory.update_priorities(np.array([2, 2]), np.array([100.0, 1.0]))
+    assert memory.tree[memory.leaves + 2] == 1.0
+    assert memory.max_priority == 100.0
+    assert np.isclose(memory.tree[1], np.sum(memory.tree[memory.leaves:]))
+
+    # A full memory replaces the oldest leaf with the largest priority
+    memory.append(6, 0, 0.0, 7, False)
+    assert memory.tree[memory.leaves] == 100.0**0.5
+    assert np.isclose(memory.tree[1], np.sum(memory.tree[memory.leaves:]))
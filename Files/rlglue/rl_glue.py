@@ -5,6 +5,8 @@
 
 from __future__ import print_function
 
+from .timing import PhaseTimer
+
 
 class RLGlue:
     """RLGlue class
@@ -12,9 +14,15 @@ class RLGlue:
     args:
         env_name (string): the name of the module where the Environment class can be found
         agent_name (string): the name of the module where the Agent class can be found
+        timing (Boolean): time every environment and agent phase, see
+            rl_enable_timing
     """
 
-    def __init__(self, env_class, agent_class):
+    # The methods rl_enable_timing wraps, each recorded under its own name
+    TIMED_PHASES = (('environment', 'env_step'), ('agent', 'agent_start'),
+                    ('agent', 'agent_step'), ('agent', 'agent_end'))
+
+    def __init__(self, env_class, agent_class, timing=False):
         self.environment = env_class()
         self.agent = agent_class()
 
@@ -23,6 +31,10 @@ class RLGlue:
         self.num_steps = None
         self.num_episodes = None
 
+        self.timer = None
+        if timing:
+            self.rl_enable_timing()
+
     def rl_init(self, agent_init_info={}, env_init_info={}):
         """Initial method called when RLGlue experiment is created"""
         self.environment.env_init(env_init_info)
@@ -38,6 +50,8 @@ class RLGlue:
         Returns:
             tuple: (state, action)
         """
+        self.total_reward = 0.0
+        self.num_steps = 1
 
         last_state = self.environment.env_start()
         self.last_action = self.agent.agent_start(last_state)
@@ -139,6 +153,48 @@ class RLGlue:
 
         return roat
 
+    def rl_enable_timing(self, timer=None):
+        """Starts timing env_step, agent_start, agent_step and agent_end
+
+        The methods are replaced by timed wrappers on the environment and agent
+        instances, the glue itself is unchanged. Without timing nothing is
+        wrapped, so there is no overhead.
+
+        Args:
+            timer (PhaseTimer): the timer to record into, a new one by default
+
+        Returns:
+            PhaseTimer: the timer
+        """
+        if self.timer is not None:
+            self.rl_disable_timing()
+        self.timer = PhaseTimer() if timer is None else timer
+        for owner, method_name in self.TIMED_PHASES:
+            self.timer.wrap(getattr(self, owner), method_name)
+        return self.timer
+
+    def rl_disable_timing(self):
+        """Restores the untimed methods
+
+        Returns:
+            PhaseTimer: the timer, which keeps the recorded timings
+        """
+        timer = self.timer
+        if timer is not None:
+            timer.unwrap()
+        self.timer = None
+        return timer
+
+    def rl_timing(self):
+        """The timings recorded since rl_enable_timing
+
+        Returns:
+            dict: the PhaseTimer summary, None when timing is disabled
+        """
+        if self.timer is None:
+            return None
+        return self.timer.summary()
+
     def rl_cleanup(self):
         """Cleanup done at end of experiment."""
         self.environment.env_cleanup()
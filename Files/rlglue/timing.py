@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""Per-phase timing for RL-Glue-py experiments.
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+
+class PhaseTimer:
+    """PhaseTimer class
+
+    Times calls to environment and agent methods by replacing them with timed
+    wrappers on the instance. Objects that were never wrapped run exactly as
+    before, so an experiment without a timer pays nothing.
+
+    Durations are buffered in a list and folded into the cumulative totals and
+    the histogram every chunk_size calls.
+
+    args:
+        bin_edges (Numpy array): increasing histogram bin edges in seconds,
+            logarithmically spaced from 100ns to 10s by default
+        chunk_size (Int): the number of durations buffered per phase
+    """
+
+    def __init__(self, bin_edges=None, chunk_size=4096):
+        if bin_edges is None:
+            bin_edges = np.geomspace(1e-7, 10, 41)
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        self.chunk_size = chunk_size
+
+        self.calls = {}
+        self.totals = {}
+        self.histograms = {}
+        self.pending = {}
+        self.wrapped = []
+        self.start_time = None
+        self.stop_time = None
+
+    def wrap(self, obj, method_name, phase=None):
+        """Replaces obj.method_name with a timed version on the instance
+
+        Args:
+            obj: the environment or agent
+            method_name (string): the name of the method, e.g. "env_step"
+            phase (string): the name the calls are recorded under, method_name
+                by default
+        """
+        if phase is None:
+            phase = method_name
+        if phase not in self.pending:
+            self.calls[phase] = 0
+            self.totals[phase] = 0.0
+            self.histograms[phase] = np.zeros(len(self.bin_edges) + 1,
+                                              dtype=np.int64)
+            self.pending[phase] = []
+
+        method = getattr(obj, method_name)
+        durations = self.pending[phase]
+        clock = time.perf_counter
+        chunk_size = self.chunk_size
+        flush = self.flush
+
+        def timed(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            durations.append(clock() - start)
+            if len(durations) >= chunk_size:
+                flush(phase)
+            return result
+
+        setattr(obj, method_name, timed)
+        self.wrapped.append((obj, method_name))
+        if self.start_time is None:
+            self.start_time = clock()
+        self.stop_time = None
+
+    def unwrap(self):
+        """Restores every wrapped method and stops the wall clock"""
+        for obj, method_name in self.wrapped:
+            # The wrapper shadows the class method, deleting it exposes the original
+            delattr(obj, method_name)
+        self.wrapped = []
+        self.flush()
+        if self.start_time is not None:
+            self.stop_time = time.perf_counter()
+
+    def flush(self, phase=None):
+        """Folds the buffered durations of phase, or of every phase, into the
+        totals and histograms"""
+        phases = list(self.pending) if phase is None else [phase]
+        for phase in phases:
+            durations = self.pending[phase]
+            if not durations:
+                continue
+            durations_array = np.array(durations)
+            self.calls[phase] += len(durations_array)
+            self.totals[phase] += durations_array.sum()
+            self.histograms[phase] += np.bincount(
+                np.searchsorted(self.bin_edges, durations_array),
+                minlength=len(self.bin_edges) + 1)
+            # Cleared in place, the wrappers hold a reference to the list
+            del durations[:]
+
+    def elapsed(self):
+        """Wall clock seconds since the first method was wrapped
+
+        Returns:
+            float: seconds until now, or until unwrap if it was called
+        """
+        if self.start_time is None:
+            return 0.0
+        stop = self.stop_time
+        if stop is None:
+            stop = time.perf_counter()
+        return stop - self.start_time
+
+    def summary(self, step_phase="env_step"):
+        """The timings of every phase
+
+        Args:
+            step_phase (string): the phase whose calls count as steps
+
+        Returns:
+            dict: maps each phase to a dict with calls, total (seconds), mean
+                (seconds), share (fraction of the wall clock) and histogram
+                (counts per bin, the first entry counts durations below
+                bin_edges[0] and the last those above bin_edges[-1]). Also
+                holds elapsed (seconds) and steps_per_second.
+        """
+        self.flush()
+        elapsed = self.elapsed()
+        summary = {}
+        for phase in self.calls:
+            calls = self.calls[phase]
+            summary[phase] = {
+                "calls": calls,
+                "total": self.totals[phase],
+                "mean": self.totals[phase] / calls if calls else 0.0,
+                "share": self.totals[phase] / elapsed if elapsed else 0.0,
+                "histogram": self.histograms[phase].copy(),
+            }
+        steps = self.calls.get(step_phase, 0)
+        summary["elapsed"] = elapsed
+        summary["steps_per_second"] = steps / elapsed if elapsed else 0.0
+        return summary
+
+    def report(self):
+        """A table of the cumulative time spent in every phase
+
+        Returns:
+            string: one line per phase
+        """
+        summary = self.summary()
+        lines = ['{:<14} {:>10} {:>12} {:>12} {:>7}'.format(
+            'Phase', 'Calls', 'Total (s)', 'Mean (us)', 'Share')]
+        for phase in self.calls:
+            timing = summary[phase]
+            lines.append('{:<14} {:>10} {:>12.4f} {:>12.2f} {:>6.1%}'.format(
+                phase, timing["calls"], timing["total"], timing["mean"] * 1e6,
+                timing["share"]))
+        lines.append('{:.1f} steps per second'.format(
+            summary["steps_per_second"]))
+        return '\n'.join(lines)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""Glues together an experiment, a batched agent, and a batch of environment
+copies that are stepped in lockstep.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+
+class VecRLGlue:
+    """VecRLGlue class
+
+    Vectorized counterpart of RLGlue. Every step advances all copies with one
+    call to the environment and one call to the agent. Copies whose episode
+    ends are restarted automatically.
+
+    args:
+        env_class: a BaseBatchEnvironment subclass
+        agent_class: a BaseBatchAgent subclass
+        num_envs (Int): the number of environment copies
+    """
+
+    def __init__(self, env_class, agent_class, num_envs):
+        self.environment = env_class()
+        self.agent = agent_class()
+        self.num_envs = num_envs
+
+        self.total_reward = None
+        self.last_action = None
+        self.num_steps = None
+        self.num_episodes = None
+
+        self.episode_returns = None
+        self.episode_steps = None
+
+    def rl_init(self, agent_init_info={}, env_init_info={}):
+        """Initial method called when VecRLGlue experiment is created"""
+        self.environment.env_init(dict(env_init_info, num_envs=self.num_envs))
+        self.agent.agent_init(dict(agent_init_info, num_envs=self.num_envs))
+
+        self.total_reward = np.zeros(self.num_envs)
+        self.num_steps = np.zeros(self.num_envs, dtype=int)
+        self.num_episodes = 0
+
+        self.episode_returns = []
+        self.episode_steps = []
+
+    def rl_start(self):
+        """Starts VecRLGlue experiment in every copy
+
+        Returns:
+            tuple: (states, actions)
+        """
+        self.total_reward[:] = 0.0
+        self.num_steps[:] = 1
+
+        last_states = self.environment.env_start()
+        self.last_action = self.agent.agent_start(last_states)
+
+        observation = (last_states, self.last_action)
+
+        return observation
+
+    def rl_step(self):
+        """Step taken by VecRLGlue in every copy, takes environment step,
+            restarts finished copies and asks the agent for the next actions.
+
+        Returns:
+            (Numpy array, Numpy array, Numpy array, Numpy array): rewards,
+                last state observations, actions, booleans indicating
+                termination. Observations of terminated copies are the first
+                observations of their next episode.
+        """
+        (rewards, last_states, terms) = self.environment.env_step(
+            self.last_action)
+
+        self.total_reward += rewards
+
+        if terms.any():
+            self.num_episodes += int(np.count_nonzero(terms))
+            self.episode_returns.append(self.total_reward[terms])
+            self.episode_steps.append(self.num_steps[terms])
+            self.total_reward[terms] = 0.0
+            self.num_steps[terms] = 0
+            last_states = last_states.copy()
+            last_states[terms] = self.environment.env_reset(terms)
+        self.num_steps += 1
+
+        self.last_action = self.agent.agent_step(rewards, last_states, terms)
+
+        return (rewards, last_states, self.last_action, terms)
+
+    def rl_run(self, num_steps):
+        """Steps every copy num_steps times
+
+        Args:
+            num_steps (Int): the number of lockstep steps to take
+        """
+        for _ in range(num_steps):
+            self.rl_step()
+
+    def rl_episodes(self, num_episodes):
+        """Steps every copy until at least num_episodes episodes have ended
+
+        Args:
+            num_episodes (Int): the number of episodes to complete, counted
+                over all copies
+
+        Returns:
+            (Numpy array, Numpy array): the return and number of steps of the
+                first num_episodes completed episodes
+        """
+        first = self.num_episodes
+        self.rl_start()
+        while self.num_episodes < first + num_episodes:
+            self.rl_step()
+
+        returns, steps = self.rl_completed_episodes()
+        return (returns[first:first + num_episodes],
+                steps[first:first + num_episodes])
+
+    def rl_completed_episodes(self):
+        """The return and number of steps of every episode completed so far
+
+        Returns:
+            (Numpy array, Numpy array): returns and number of steps
+        """
+        if not self.episode_returns:
+            return np.zeros(0), np.zeros(0, dtype=int)
+        return (np.concatenate(self.episode_returns),
+                np.concatenate(self.episode_steps))
+
+    def rl_cleanup(self):
+        """Cleanup done at end of experiment."""
+        self.environment.env_cleanup()
+        self.agent.agent_cleanup()
+
+    def rl_agent_message(self, message):
+        """Message passed to communicate with agent during experiment
+
+        Args:
+            message: the message (or question) to send to the agent
+
+        Returns:
+            The message back (or answer) from the agent
+
+        """
+
+        return self.agent.agent_message(message)
+
+    def rl_env_message(self, message):
+        """Message passed to communicate with environment during experiment
+
+        Args:
+            message: the message (or question) to send to the environment
+
+        Returns:
+            The message back (or answer) from the environment
+
+        """
+        return self.environment.env_message(message)
+
+    def rl_return(self):
+        """The reward collected so far in the current episode of every copy
+
+        Returns:
+            Numpy array: the total reward of each copy
+        """
+        return self.total_reward
+
+    def rl_num_steps(self):
+        """The number of steps taken in the current episode of every copy
+
+        Returns:
+            Numpy array: the number of steps of each copy
+        """
+        return self.num_steps
+
+    def rl_num_episodes(self):
+        """The number of episodes completed over all copies
+
+        Returns
+            Int: the total number of episodes
+
+        """
+        return self.num_episodes
@@ -5,6 +5,7 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 from IPython import display
 import time
 import json
+import os
 from copy import deepcopy
 
 plt.rc('font', size=30)  # controls default text sizes
@@ -62,7 +63,9 @@ class ParkingWorld:
                  num_prices=4,
                  price_factor=0.1,
                  occupants_factor=1.0,
-                 null_factor=1 / 3):
+                 null_factor=1 / 3,
+                 dtype=np.float64,
+                 model=None):
         self.__num_spaces = num_spaces
         self.__num_prices = num_prices
         self.__occupants_factor = occupants_factor
@@ -70,9 +73,95 @@ class ParkingWorld:
         self.__null_factor = null_factor
         self.__S = [num_occupied for num_occupied in range(num_spaces + 1)]
         self.__A = list(range(num_prices))
+        self.__dtype = np.dtype(dtype)
+        if model is None:
+            model = self.__compile()
+        # model is (P, R), or (P, R, expected_rewards) to skip computing them
+        self.__P, self.__R = model[:2]
+        if len(model) == 3:
+            self.__expected_rewards = model[2]
+        else:
+            self.__expected_rewards = np.einsum('ijk,ik->ij', self.__P,
+                                                self.__R)
+        self.__expected_rewards.flags.writeable = False
+
+    def __compile(self):
+        """Tabulate p(s' | s, a) as P[s, a, s'] and the reward as R[s, s']."""
+        states = np.arange(self.__num_spaces + 1)
+        actions = np.arange(self.__num_prices)
+        state_rewards = (states * self.__occupants_factor).astype(float)
+        state_rewards[-1] = (self.__null_factor * self.__num_spaces *
+                             self.__occupants_factor)
+        R = state_rewards[:, None] + state_rewards[None, :]
+
+        # Built a block of states at a time, so the float64 temporaries stay
+        # near 4 MB however many spaces there are
+        P = np.empty((len(states), len(actions), len(states)), self.__dtype)
+        block = max(1, 2**19 // (len(actions) * 2 * self.__num_spaces + 1))
+        for start in range(0, len(states), block):
+            s = states[start:start + block]
+            center = (1 - self.__price_factor) * s[:, None] + (
+                self.__price_factor * self.__num_spaces *
+                (1 - actions[None, :] / self.__num_prices))
+            emphasis = np.exp(-abs(
+                np.arange(2 * self.__num_spaces) - center[:, :, None]) / 5)
+            # Sequential sums, so every entry matches the per-call computation
+            total = np.cumsum(emphasis, axis=2)[:, :, -1:]
+            tail = np.cumsum(emphasis[:, :, self.__num_spaces:],
+                             axis=2)[:, :, -1]
+            # Computed in float64 and rounded once, so float32 models lose
+            # nothing more
+            P[start:start + block] = (emphasis[:, :, :self.__num_spaces + 1] /
+                                      total)
+            P[start:start + block, :, -1] = tail / total[:, :, 0]
+
+        R = R.astype(self.__dtype, copy=False)
+        P.flags.writeable = False
+        R.flags.writeable = False
+        return P, R
+
+    def save(self, path):
+        """Save P, R and the expected rewards to directory path, one .npy file each, and the parameters to meta.json."""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "P": self.__P,
+            "R": self.__R,
+            "expected_rewards": self.__expected_rewards,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), array)
+        meta = {
+            "version": 1,
+            "num_spaces": self.__num_spaces,
+            "num_prices": self.__num_prices,
+            "price_factor": self.__price_factor,
+            "occupants_factor": self.__occupants_factor,
+            "null_factor": self.__null_factor,
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Load a model written by save, memory mapping the arrays read only by default."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != 1:
+            raise ValueError("Unsupported model version {}".format(
+                meta["version"]))
+
+        def load_array(name):
+            return np.load(os.path.join(path, name + ".npy"),
+                           mmap_mode=mmap_mode)
+
+        model = tuple(
+            load_array(name) for name in ("P", "R", "expected_rewards"))
+        return cls(meta["num_spaces"], meta["num_prices"],
+                   meta["price_factor"], meta["occupants_factor"],
+                   meta["null_factor"], model[0].dtype, model)
 
     def transitions(self, s, a):
-        return np.array([[r, self.p(s_, r, s, a)] for s_, r in self.support(s, a)])
+        return np.stack((self.__R[s], self.__P[s, a]), axis=1)
 
     def support(self, s, a):
         return [(s_, self.reward(s, s_)) for s_ in self.__S]
@@ -81,17 +170,10 @@ class ParkingWorld:
         if r != self.reward(s, s_):
             return 0
         else:
-            center = (1 - self.__price_factor
-                      ) * s + self.__price_factor * self.__num_spaces * (
-                          1 - a / self.__num_prices)
-            emphasis = np.exp(
-                -abs(np.arange(2 * self.__num_spaces) - center) / 5)
-            if s_ == self.__num_spaces:
-                return sum(emphasis[s_:]) / sum(emphasis)
-            return emphasis[s_] / sum(emphasis)
+            return self.__P[s, a, s_]
 
     def reward(self, s, s_):
-        return self.state_reward(s) + self.state_reward(s_)
+        return self.__R[s, s_]
 
     def state_reward(self, s):
         if s == self.__num_spaces:
@@ -103,10 +185,47 @@ class ParkingWorld:
         return np.random.randint(self.__num_prices)
 
     def step(self, s, a):
-        probabilities = [
-            self.p(s_, self.reward(s, s_), s, a) for s_ in self.__S
-        ]
-        return np.random.choice(self.__S, p=probabilities)
+        p = self.__P[s, a]
+        if p.dtype != np.float64:
+            # np.random.choice checks the sum to 1 in float64
+            p = p.astype(np.float64)
+            p /= p.sum()
+        return np.random.choice(self.__S, p=p)
+
+    @property
+    def P(self):
+        """P[s, a, s'] is the probability that action a from state s results in state s'."""
+        return self.__P
+
+    @property
+    def R(self):
+        """R[s, s'] is the reward for moving from state s to state s'."""
+        return self.__R
+
+    # The arrays below give ParkingWorld the model layout of gridWorld.Env, so
+    # the solvers in dp.py accept it. Every state can follow every (s, a).
+    dense = True
+
+    @property
+    def next_states(self):
+        return np.broadcast_to(np.arange(self.__num_spaces + 1),
+                               self.__P.shape)
+
+    @property
+    def probabilities(self):
+        return self.__P
+
+    @property
+    def expected_rewards(self):
+        return self.__expected_rewards
+
+    @property
+    def dtype(self):
+        return self.__dtype
+
+    @property
+    def terminal_mask(self):
+        return np.zeros(self.__num_spaces + 1, dtype=bool)
 
     @property
     def A(self):
@@ -118,7 +237,7 @@ class ParkingWorld:
 
     @property
     def num_prices(self):
-        return self.num_prices
+        return self.__num_prices
 
     @property
     def S(self):
@@ -0,0 +1,367 @@
+"""
+Benchmarks for the gridworld and parking models and the dp solvers
+
+Every benchmark also checks the vectorized code against a reference implementation:
+the scalar model methods of gridWorld.Env, the dense update of the original dp module
+and the per-state loops of Files/Assignment2.py
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json
+
+Results are written as JSON. With --baseline, a benchmark whose best time grew by more
+than --tolerance over the stored result counts as a regression and the exit status is 1,
+as it is when a check against a reference fails
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import dp
+import gridWorld as gw
+from Files import tools
+
+
+def measure(function, repeat):
+    """
+    Calls function repeat times
+    Returns (best, median) duration in seconds and the result of the last call
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), float(np.median(times)), result
+
+
+def reference_transitions(env: gw.Env):
+    """
+    Dense (S, A, S, R) model built one entry at a time with Env._initial_prob
+    """
+    dense = np.zeros((len(env.S), len(env.A), len(env.S), len(env.R)))
+    for s in env.S:
+        for a in env.A:
+            for s_ in env.S:
+                for i, r in enumerate(env.R):
+                    dense[s, a, s_, i] = env._initial_prob(s, s_, a, r)
+    return dense
+
+
+def reference_policy_evaluation(env: gw.Env, gamma, threshold):
+    """
+    Synchronous evaluation of env.policy on the dense model, as the original dp module did it
+    """
+    transitions = env.dense_transitions()
+    state_values = np.zeros(env.S.size)
+    while True:
+        temp = transitions * (env.R + gamma * state_values.reshape((-1, 1)))
+        sum_sr = np.sum(temp, axis=(2, 3))
+        new_state_values = np.sum(env.policy * sum_sr, axis=1)
+        largest_diff = np.max(np.abs(state_values - new_state_values))
+        state_values = new_state_values
+        if largest_diff < threshold:
+            return state_values
+
+
+def reference_policy_improvement(env: gw.Env, state_values, gamma):
+    """
+    The per-state loop of the original dp.policy_improvement
+    Returns (policy, stable) without changing env.policy
+    """
+    stable = True
+    policy = env.policy.copy()
+    values = env.dense_transitions() * (env.R +
+                                        gamma * state_values.reshape((-1, 1)))
+    values = np.sum(values, axis=(2, 3))
+    optimal_actions_all = np.max(values, axis=1)
+    for s in env.S:
+        if s in env.TerminalStates:
+            continue
+        optimal_actions = np.where(np.isclose(values[s, :],
+                                              optimal_actions_all[s]))[0]
+        new_policy = np.zeros(len(env.A))
+        new_policy[optimal_actions] = 1 / len(optimal_actions)
+        stable = stable and np.array_equal(new_policy, policy[s])
+        policy[s] = new_policy
+    return policy, stable
+
+
+def bellman_update(env, V, pi, s, gamma):
+    # bellman_update of Files/Assignment2.py
+    value = 0
+    for action in env.A:
+        action_prob = pi[s, action]
+        current = 0
+        for new_state, (r, p) in enumerate(env.transitions(s, action)):
+            current += p * (r + gamma * V[new_state])
+        value += action_prob * current
+    V[s] = value
+
+
+def evaluate_policy(env, V, pi, gamma, theta):
+    # evaluate_policy of Files/Assignment2.py
+    delta = float('inf')
+    while delta > theta:
+        delta = 0
+        for s in env.S:
+            v = V[s]
+            bellman_update(env, V, pi, s, gamma)
+            delta = max(delta, abs(v - V[s]))
+    return V
+
+
+def bellman_optimality_update(env, V, s, gamma):
+    # bellman_optimality_update of Files/Assignment2.py
+    max_value = float('-inf')
+    for a in env.A:
+        current = 0
+        for new_state, (r, p) in enumerate(env.transitions(s, a)):
+            current += p * (r + gamma * V[new_state])
+        max_value = max(max_value, current)
+    V[s] = max_value
+
+
+def value_iteration(env, gamma, theta):
+    # value_iteration of Files/Assignment2.py, without the final greedification
+    V = np.zeros(len(env.S))
+    while True:
+        delta = 0
+        for s in env.S:
+            v = V[s]
+            bellman_optimality_update(env, V, s, gamma)
+            delta = max(delta, abs(v - V[s]))
+        if delta < theta:
+            return V
+
+
+def grid_benchmarks(size, reference_limit):
+    """
+    Benchmarks on a size * size grid with terminal corners
+    Yields (name, function, check), check receives the result of function and
+    returns whether it matches the reference
+    """
+    grid = (size, size)
+    terminal_states = [0, size * size - 1]
+    env = gw.Env(grid, terminal_states, seed=0)
+    checked = env.S.size <= reference_limit
+
+    def construction_check(env):
+        if not checked:
+            return None
+        return bool(np.array_equal(env.dense_transitions(),
+                                   reference_transitions(env)))
+
+    yield ("env_construction", lambda: gw.Env(grid, terminal_states),
+           construction_check)
+
+    calls = 1000
+    states = env.rng.integers(env.S.size, size=calls)
+    actions = env.rng.integers(len(env.A), size=calls)
+
+    def call_loop():
+        return [env(s, a) for s, a in zip(states, actions)]
+
+    def call_check(outcomes):
+        expected = [env._initial_successors(s, a)[0][:2]
+                    for s, a in zip(states, actions)]
+        return all(s_ == e_s and r == e_r
+                   for (s_, r), (e_s, e_r) in zip(outcomes, expected))
+
+    yield ("env_call", call_loop, call_check)
+
+    gamma, threshold = 0.9, 1e-10
+
+    def evaluation_check(state_values):
+        if not checked:
+            return None
+        reference = reference_policy_evaluation(env, gamma, threshold)
+        return bool(np.allclose(state_values, reference, rtol=0, atol=1e-8))
+
+    yield ("policy_evaluation",
+           lambda: dp.policy_evaluation(env, discount=gamma,
+                                        threshold=threshold, verbose=False),
+           evaluation_check)
+
+    state_values = dp.policy_evaluation(env, discount=gamma,
+                                        threshold=threshold, verbose=False)
+    policy = env.policy.copy()
+
+    def improvement():
+        env.policy[...] = policy
+        return dp.policy_improvement(env, state_values, gamma)
+
+    def improvement_check(stable):
+        if not checked:
+            return None
+        env.policy[...] = policy
+        reference, reference_stable = reference_policy_improvement(
+            env, state_values, gamma)
+        dp.policy_improvement(env, state_values, gamma)
+        return bool(stable == reference_stable
+                    and np.array_equal(env.policy, reference))
+
+    yield ("policy_improvement", improvement, improvement_check)
+
+
+def parking_benchmarks(num_spaces, reference_limit):
+    """
+    Benchmarks on a ParkingWorld with num_spaces spaces and 4 prices, see grid_benchmarks
+    The Assignment2 loops are timed next to the dp solvers they are checked against
+    """
+    num_prices = 4
+    env = tools.ParkingWorld(num_spaces, num_prices)
+    checked = num_spaces + 1 <= reference_limit
+    gamma, theta = 0.9, 1e-10
+    city_policy = np.zeros((num_spaces + 1, num_prices))
+    city_policy[:, 1] = 1
+
+    yield ("parking_construction",
+           lambda: tools.ParkingWorld(num_spaces, num_prices), lambda _: None)
+
+    evaluation = {}
+
+    def reference_evaluation():
+        V = np.zeros(num_spaces + 1)
+        evaluation["reference"] = evaluate_policy(env, V, city_policy, gamma,
+                                                  theta)
+        return evaluation["reference"]
+
+    if checked:
+        yield ("assignment2_evaluate_policy", reference_evaluation,
+               lambda _: None)
+
+    def evaluation_check(result):
+        if "reference" not in evaluation:
+            return None
+        return bool(np.allclose(result[0][0], evaluation["reference"],
+                                rtol=0, atol=1e-6))
+
+    yield ("parking_policy_evaluation",
+           lambda: dp.batch_solve(env, gamma, policies=city_policy,
+                                  threshold=theta, verbose=False),
+           evaluation_check)
+
+    optimal = {}
+
+    def reference_optimal():
+        optimal["reference"] = value_iteration(env, gamma, theta)
+        return optimal["reference"]
+
+    if checked:
+        yield ("assignment2_value_iteration", reference_optimal,
+               lambda _: None)
+
+    def optimal_check(result):
+        if "reference" not in optimal:
+            return None
+        return bool(np.allclose(result[0], optimal["reference"], rtol=0,
+                                atol=1e-6))
+
+    yield ("parking_value_iteration",
+           lambda: dp.value_iteration(env, discount=gamma, threshold=theta,
+                                      verbose=False), optimal_check)
+
+
+def run(grid_sizes, parking_sizes, repeat, reference_limit):
+    """
+    Runs every benchmark
+    Returns a list of records with the benchmark name, its parameters, the best and median
+    time in seconds and equivalent (True, False or None when no reference was run)
+    """
+    suites = [(grid_benchmarks, "grid_size", size) for size in grid_sizes]
+    suites += [(parking_benchmarks, "num_spaces", size)
+               for size in parking_sizes]
+    records = []
+    for benchmarks, parameter, size in suites:
+        for name, function, check in benchmarks(size, reference_limit):
+            best, median, result = measure(function, repeat)
+            records.append({
+                "name": name,
+                "params": {
+                    parameter: size
+                },
+                "seconds_min": best,
+                "seconds_median": median,
+                "repeat": repeat,
+                "equivalent": check(result),
+            })
+            print("{:<28} {:>6} {:>12.6f} s{}".format(
+                name, size, best,
+                " MISMATCH" if records[-1]["equivalent"] is False else ""),
+                  file=sys.stderr)
+    return records
+
+
+def key(record):
+    return record["name"], json.dumps(record["params"], sort_keys=True)
+
+
+def regressions(records, baseline, tolerance):
+    """
+    Returns the records whose best time exceeds the baseline's by more than tolerance,
+    each paired with the baseline time
+    """
+    previous = {key(record): record for record in baseline["results"]}
+    slower = []
+    for record in records:
+        old = previous.get(key(record))
+        if old is not None and (record["seconds_min"] >
+                                old["seconds_min"] * (1 + tolerance)):
+            slower.append((record, old["seconds_min"]))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grid-sizes", type=int, nargs="+",
+                        default=[4, 8, 16, 32])
+    parser.add_argument("--parking-sizes", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reference-limit", type=int, default=64,
+                        help="largest number of states checked against the slow references")
+    parser.add_argument("--output", help="JSON file for the results, stdout by default")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    records = run(args.grid_sizes, args.parking_sizes, args.repeat,
+                  args.reference_limit)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": records,
+    }
+    status = 0
+    if any(record["equivalent"] is False for record in records):
+        status = 1
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(records, baseline, args.tolerance)
+        for record, old in slower:
+            print("Regression: {} {} took {:.6f} s, baseline {:.6f} s".format(
+                record["name"], record["params"], record["seconds_min"], old),
+                  file=sys.stderr)
+        report["regressions"] = [
+            dict(name=record["name"], params=record["params"], baseline=old)
+            for record, old in slower
+        ]
+        if slower:
+            status = 1
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,147 @@
+import heapq
+import inspect
+import time
+import tracemalloc
+from contextlib import contextmanager
 import numpy as np
 from gridWorld import Env
 
 
+class SolverTrace:
+    """
+    Collects the records that the solvers in this module send to their callback, pass an instance as callback
+    Every record is a dict with phase, iteration, residual, seconds, bytes, backups and backups_per_second
+    bytes is the peak memory allocated during the iteration and is only measured while tracemalloc is tracing,
+    pass track_memory=True to start it, otherwise and on Python < 3.9 it is None
+    """
+
+    def __init__(self, track_memory=False, on_record=None):
+        self.records = []
+        self.on_record = on_record
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, record):
+        self.records.append(record)
+        if self.on_record is not None:
+            self.on_record(record)
+
+    def history(self, key, phase="evaluation"):
+        """
+        Returns the values of key over the records of given phase as an array
+        """
+        return np.array([r[key] for r in self.records if r["phase"] == phase])
+
+
+# Meters that are measuring, outermost first, see start_meter
+_open_meters = []
+
+
+def start_meter():
+    """
+    Marks the start of a solver iteration, pass the result to emit_record
+    tracemalloc has a single peak, so starting a meter folds the peak so far into the meters
+    already open before resetting it, and nested measurements leave the outer ones intact
+    Without tracemalloc.reset_peak (Python < 3.9) no bytes are measured
+    """
+    start = time.perf_counter()
+    if not tracemalloc.is_tracing() or not hasattr(tracemalloc, "reset_peak"):
+        return [start, None, None]
+    peak = tracemalloc.get_traced_memory()[1]
+    for meter in _open_meters:
+        meter[2] = max(meter[2], peak)
+    tracemalloc.reset_peak()
+    allocated = tracemalloc.get_traced_memory()[0]
+    meter = [start, allocated, allocated]
+    _open_meters.append(meter)
+    return meter
+
+
+def stop_meter(meter):
+    """
+    Ends a measurement, returns the peak bytes allocated since start_meter or None
+    """
+    if meter[1] is None:
+        return None
+    peak = tracemalloc.get_traced_memory()[1]
+    for open_meter in _open_meters:
+        open_meter[2] = max(open_meter[2], peak)
+    _open_meters[:] = [m for m in _open_meters if m is not meter]
+    return meter[2] - meter[1]
+
+
+@contextmanager
+def measuring(callback):
+    """
+    Meters the block when callback is given, yielding the meter for emit_record or None
+    The meter is closed on leaving the block, also when a solver raises before emitting its record
+    """
+    if callback is None:
+        yield None
+        return
+    meter = start_meter()
+    try:
+        yield meter
+    finally:
+        _open_meters[:] = [m for m in _open_meters if m is not meter]
+
+
+def emit_record(callback, meter, phase, iteration, residual, backups):
+    seconds = time.perf_counter() - meter[0]
+    allocated = stop_meter(meter)
+    callback({
+        "phase": phase,
+        "iteration": iteration,
+        "residual": float(residual),
+        "seconds": seconds,
+        "bytes": allocated,
+        "backups": backups,
+        "backups_per_second": backups / seconds if seconds else float("inf"),
+    })
+
+
+def successor_values(env: Env, state_values, states=slice(None)):
+    """
+    Returns sum of p(s' | s, a) * V(s') for every action of the given states
+    Models with env.dense set list every state as successor, so a matrix product replaces the gather
+    Deterministic models gather the single successor of every (s, a)
+    """
+    if env.dense:
+        return env.probabilities[states] @ state_values
+    if getattr(env, "deterministic", False):
+        return state_values[env.next_state[states]]
+    return np.sum(env.probabilities[states] *
+                  state_values[env.next_states[states]],
+                  axis=-1)
+
+
+def action_values(env: Env, state_values, gamma):
+    """
+    Returns q(s, a) = r(s, a) + gamma * sum of p(s' | s, a) * V(s')
+    """
+    return env.expected_rewards + gamma * successor_values(env, state_values)
+
+
+def converged(largest_diff, threshold, state_values):
+    """
+    Tests the largest change of a sweep against threshold
+    Below float64, threshold is raised to a few units in the last place of the largest value,
+    so float32 solves stop once float32 can no longer resolve the change
+    Batched values of shape (B, S) with largest_diff of shape (B,) are tested per member
+    """
+    eps = np.finfo(state_values.dtype).eps
+    if eps > np.finfo(np.float64).eps:
+        threshold = np.maximum(
+            threshold,
+            8 * eps * np.max(np.abs(state_values), axis=-1, initial=0))
+    return largest_diff < threshold
+
+
 def update_state_values(env: Env, state_values, gamma):
-    new_state_values = np.zeros(state_values.shape)
+    new_state_values = np.zeros(state_values.shape, dtype=state_values.dtype)
     largest_diff = 0
     # Calculate sum of p * (r + gamma * V(s'))
-    temp = env.transitions * (env.R + gamma * state_values.reshape((-1, 1)))
-    sum_sr = np.sum(temp, axis=(2, 3))
+    sum_sr = action_values(env, state_values, gamma)
     # Multiply return by policy
     sum_sa = env.policy * sum_sr
     new_state_values = np.sum(sum_sa, axis=1)
@@ -16,39 +150,594 @@ def update_state_values(env: Env, state_values, gamma):
     return state_values, largest_diff
 
 
-def policy_evaluation(env: Env, state_values=None, discount=1.0):
+def update_state_values_in_place(state_values, blocks):
+    """
+    Sweeps the blocks of states in order, writing each block back into state_values before the next one
+    blocks comes from compile_sweep_blocks
+    """
+    largest_diff = 0
+    for states, policy_rewards, weights, successors in blocks:
+        if weights.ndim == 1:
+            # Single state block, a plain dot product avoids einsum overhead
+            new_value = policy_rewards + weights.dot(state_values[successors])
+            largest_diff = max(largest_diff,
+                               abs(state_values[states] - new_value))
+            state_values[states] = new_value
+            continue
+        new_values = policy_rewards + np.einsum(
+            "ij,ij->i", weights, state_values[successors])
+        largest_diff = max(largest_diff,
+                           np.max(np.abs(state_values[states] - new_values)))
+        state_values[states] = new_values
+    return state_values, largest_diff
+
+
+def sweep_partition(env: Env, sweep):
+    """
+    Returns the blocks of states of an in-place sweep, in update order
+    "gauss-seidel" gives one block per state, "rows" one block per row of the grid and
+    "red-black" one block per color of env.state_colors()
+    """
+    if sweep == "gauss-seidel":
+        return np.arange(len(env.probabilities))
+    if sweep in ("rows", "red-black") and not hasattr(env, "state_colors"):
+        raise ValueError(
+            "Sweep {} needs a grid model such as gridWorld.Env, use jacobi or gauss-seidel".format(
+                sweep))
+    if sweep == "rows":
+        return list(env.S.reshape(env.size))
+    if sweep == "red-black":
+        colors = env.state_colors()
+        return [np.flatnonzero(colors == c) for c in np.unique(colors)]
+    raise ValueError("Unknown sweep {}".format(sweep))
+
+
+def compile_sweep_blocks(env: Env, gamma, sweep):
+    """
+    Splits the states into the blocks of an in-place sweep and folds env.policy into each block
+    Returns [(states, sum_a pi * r(s, a), gamma * pi * p flattened over (a, k), successors flattened over (a, k))]
+    """
+    partition = sweep_partition(env, sweep)
+    policy_rewards = np.sum(env.policy * env.expected_rewards, axis=1)
+    weights = gamma * env.policy[:, :, None] * env.probabilities
+    weights = weights.reshape((env.S.size, -1))
+    successors = env.next_states.reshape((env.S.size, -1))
+    return [(states, policy_rewards[states], weights[states],
+             successors[states]) for states in partition]
+
+
+def policy_evaluation(env: Env,
+                      state_values=None,
+                      discount=1.0,
+                      sweep="jacobi",
+                      threshold=1e-15,
+                      callback=None,
+                      verbose=True,
+                      max_iterations=None,
+                      solver="iterative"):
+    """
+    Evaluates env.policy until the largest change in a sweep is below threshold, or for at most max_iterations sweeps
+    sweep is "jacobi" (synchronous), "gauss-seidel" (in-place, state by state), "rows" (in-place,
+    one vectorized update per grid row) or "red-black" (in-place, one vectorized update per color
+    of env.state_colors())
+    gauss-seidel runs a Python loop over the states and is only meant for small models, on large
+    grids rows and red-black keep most of its gain in sweeps at a fraction of the cost per sweep
+    solver other than "iterative" solves the Bellman equation as a linear system instead, see solve_policy_values
+    callback, if given, receives a record for every sweep, see SolverTrace
+    """
+    if solver != "iterative":
+        return solve_policy_values(env, discount, solver, threshold, callback,
+                                   verbose)
     num_iter = 0
     largest_diff = 0.0
-    threshold = 1
-    threshold = 0.000000000000001
-    diff_history = []
     if state_values is None:
-        state_values = np.zeros(env.S.size)
+        state_values = np.zeros(env.S.size, dtype=env.dtype)
+    state_values = np.asarray(state_values, dtype=env.dtype)
+    if sweep != "jacobi":
+        blocks = compile_sweep_blocks(env, discount, sweep)
+        state_values = state_values.copy()
     while True:
-        state_values, largest_diff = update_state_values(
-            env, state_values, discount)
-        diff_history.append(largest_diff)
-        num_iter += 1
-        if largest_diff < threshold:
-            print(
-                f"Converged with diff {largest_diff} after {num_iter} iterations."
-            )
+        with measuring(callback) as meter:
+            if sweep == "jacobi":
+                state_values, largest_diff = update_state_values(
+                    env, state_values, discount)
+            else:
+                state_values, largest_diff = update_state_values_in_place(
+                    state_values, blocks)
+            num_iter += 1
+            if meter is not None:
+                emit_record(callback, meter, "evaluation", num_iter,
+                            largest_diff, env.S.size)
+        if converged(largest_diff, threshold, state_values):
+            if verbose:
+                print(
+                    f"Converged with diff {largest_diff} after {num_iter} iterations."
+                )
+            break
+        if max_iterations is not None and num_iter >= max_iterations:
             break
     return state_values
 
 
-def policy_improvement(env: Env, state_values, gamma: float = 1.0):
-    stable = True
-    values = env.transitions * (env.R + gamma * state_values.reshape((-1, 1)))
-    values = np.sum(values, axis=(2, 3))
-    optimal_actions_all = np.max(values, axis=1)
-    for s in env.S:
-        if s in env.TerminalStates:
-            continue
-        optimal_actions = np.where(np.isclose(
-            values[s, :], optimal_actions_all[s]))[0]
-        new_policy = np.zeros(len(env.A))
-        new_policy[optimal_actions] = 1 / len(optimal_actions)
-        stable = stable and np.array_equal(new_policy, env.policy[s])
-        env.policy[s] = new_policy
+def policy_linear_system(env: Env, gamma, sparse=False):
+    """
+    Builds the Bellman equation of env.policy as the linear system (I - gamma * P_pi) V = r_pi
+    Terminal states get the row V(s) = 0, which keeps the system regular when gamma = 1
+    Returns (matrix, r_pi), the matrix is a scipy.sparse CSR matrix if sparse is set
+    """
+    size = env.S.size
+    weights = env.policy[:, :, None] * env.probabilities
+    rows = np.broadcast_to(env.S[:, None, None], weights.shape)
+    outcomes = (weights != 0) & ~env.terminal_mask[rows]
+    rows = np.concatenate((rows[outcomes], env.S))
+    cols = np.concatenate((env.next_states[outcomes], env.S))
+    data = np.concatenate(
+        (-gamma * weights[outcomes], np.ones(size, dtype=env.dtype)))
+    policy_rewards = np.sum(env.policy * env.expected_rewards, axis=1)
+    policy_rewards[env.terminal_mask] = 0
+
+    if sparse:
+        from scipy import sparse as sp
+        # Duplicate (row, col) entries are summed, as with np.add.at below
+        matrix = sp.csr_matrix((data, (rows, cols)), shape=(size, size))
+    else:
+        matrix = np.zeros((size, size), dtype=env.dtype)
+        np.add.at(matrix, (rows, cols), data)
+    return matrix, policy_rewards
+
+
+def solve_policy_values(env: Env,
+                        gamma,
+                        solver="direct",
+                        threshold=1e-15,
+                        callback=None,
+                        verbose=True):
+    """
+    Evaluates env.policy exactly by solving (I - gamma * P_pi) V = r_pi
+    solver is "direct" (dense LU, for small grids), "gmres" or "bicgstab" (scipy.sparse.linalg with
+    an incomplete LU preconditioner, for large grids)
+    The Krylov solvers stop at a relative residual of threshold, but not below 1e-12 which is
+    about as far as they get in double precision
+    Raises ValueError if the system is singular, which happens with gamma = 1 when the policy
+    can avoid the terminal states forever
+    """
+    with measuring(callback) as meter:
+        if solver == "direct":
+            matrix, policy_rewards = policy_linear_system(env, gamma)
+            try:
+                state_values = np.linalg.solve(matrix, policy_rewards)
+            except np.linalg.LinAlgError:
+                raise ValueError(
+                    "Policy never terminates, its values are unbounded")
+        elif solver in ("gmres", "bicgstab"):
+            from scipy.sparse import linalg as spla
+            matrix, policy_rewards = policy_linear_system(env, gamma,
+                                                          sparse=True)
+            try:
+                factor = spla.spilu(matrix.tocsc())
+            except RuntimeError:
+                raise ValueError(
+                    "Policy never terminates, its values are unbounded")
+            preconditioner = spla.LinearOperator(matrix.shape, factor.solve)
+            solve = getattr(spla, solver)
+            # scipy renamed tol to rtol in 1.12
+            tolerance = "rtol" if "rtol" in inspect.signature(
+                solve).parameters else "tol"
+            state_values, info = solve(
+                matrix, policy_rewards, x0=factor.solve(policy_rewards),
+                M=preconditioner, atol=0,
+                **{
+                    tolerance:
+                    max(threshold, 1e-12, 8 * np.finfo(env.dtype).eps)
+                })
+            if info != 0:
+                raise ValueError("{} did not converge (info {})".format(
+                    solver, info))
+        else:
+            raise ValueError("Unknown solver {}".format(solver))
+
+        residual = np.max(np.abs(matrix @ state_values - policy_rewards))
+        if meter is not None:
+            emit_record(callback, meter, "evaluation", 1, residual,
+                        env.S.size)
+    if verbose:
+        print(f"Solved with residual {residual} using {solver}.")
+    return state_values
+
+
+def greedy_policy(values, dtype=None):
+    """
+    Returns the policy that is greedy with respect to action values, actions within np.isclose
+    of the best share probability equally
+    The absolute tolerance of np.isclose is widened to the precision of values when that is coarser
+    The policy has the given dtype, that of values by default, so it compares equal to a stored policy
+    """
+    atol = max(1e-8, 8 * np.finfo(values.dtype).eps)
+    optimal_actions = np.isclose(values,
+                                 np.max(values, axis=1)[:, None],
+                                 atol=atol)
+    policy = optimal_actions / np.sum(optimal_actions, axis=1, keepdims=True)
+    return policy.astype(values.dtype if dtype is None else dtype, copy=False)
+
+
+def policy_improvement(env: Env,
+                       state_values,
+                       gamma: float = 1.0,
+                       callback=None):
+    """
+    Makes env.policy greedy with respect to state_values, ties share probability equally
+    Returns True if the policy did not change
+    callback, if given, receives one record whose residual is the largest max_a q(s, a) - V(s)
+    """
+    with measuring(callback) as meter:
+        values = action_values(env, state_values, gamma)
+        optimal_actions_all = np.max(values, axis=1)
+        new_policy = greedy_policy(values, env.policy.dtype)
+        # Terminal states keep their policy
+        update = ~env.terminal_mask
+        stable = np.array_equal(new_policy[update], env.policy[update])
+        env.policy[update] = new_policy[update]
+        if meter is not None:
+            residual = np.max(np.abs(optimal_actions_all - state_values))
+            emit_record(callback, meter, "improvement", 1, residual,
+                        env.S.size * len(env.A))
     return stable
+
+
+def policy_iteration(env: Env,
+                     state_values=None,
+                     discount=1.0,
+                     sweep="jacobi",
+                     threshold=1e-15,
+                     eval_sweeps=None,
+                     adaptive=None,
+                     callback=None,
+                     verbose=True,
+                     solver="iterative"):
+    """
+    Alternates policy_evaluation and policy_improvement until env.policy is stable
+    Every evaluation warm starts from the values of the previous round
+    eval_sweeps=k gives modified policy iteration, each round evaluates with at most k sweeps
+    adaptive=eta evaluates each round only until the change is below eta times the Bellman residual
+    max_a q(s, a) - V(s) of the last improvement, so early rounds stop early and later rounds tighten
+    Once a truncated round leaves the policy unchanged the next round evaluates fully to threshold,
+    so the result is the same as plain policy iteration
+    solver is passed on to policy_evaluation, an exact solver makes eval_sweeps and adaptive moot
+    Returns the value of the final policy
+    callback receives the records of both phases and one "iteration" record per round
+    """
+    stable = False
+    num_iter = 0
+    if state_values is None:
+        state_values = np.zeros(env.S.size, dtype=env.dtype)
+    truncated = eval_sweeps is not None or adaptive is not None
+    confirming = False
+    tolerance = threshold
+
+    def adaptive_tolerance():
+        greedy_values = np.max(action_values(env, state_values, discount),
+                               axis=1)
+        return max(threshold,
+                   adaptive * np.max(np.abs(greedy_values - state_values)))
+
+    if adaptive is not None:
+        tolerance = adaptive_tolerance()
+    phase_callback = callback
+    if callback is not None:
+        round_backups = [0]
+
+        def phase_callback(record):
+            round_backups[0] += record["backups"]
+            callback(record)
+
+    while True:
+        with measuring(callback) as meter:
+            if meter is not None:
+                round_backups[0] = 0
+                previous_values = state_values
+            full = not truncated or confirming
+            state_values = policy_evaluation(env, state_values, discount,
+                                             sweep,
+                                             threshold if full else tolerance,
+                                             phase_callback, verbose,
+                                             None if full else eval_sweeps,
+                                             solver)
+            stable = policy_improvement(env, state_values, discount,
+                                        phase_callback)
+            num_iter += 1
+            if meter is not None:
+                # The residual of a round is the largest change of V over it
+                residual = np.max(np.abs(state_values - previous_values))
+                emit_record(callback, meter, "iteration", num_iter, residual,
+                            round_backups[0])
+        if stable and full:
+            break
+        confirming = stable
+        if adaptive is not None:
+            tolerance = adaptive_tolerance()
+    return state_values
+
+
+def update_optimal_values(env: Env, state_values, gamma, partition=None):
+    """
+    Applies the Bellman optimality backup V(s) = max_a q(s, a)
+    Without partition every state is updated from the old values, otherwise the blocks of
+    partition are updated in place one after another
+    Returns (state_values, largest_diff)
+    """
+    if partition is None:
+        new_state_values = np.max(action_values(env, state_values, gamma),
+                                  axis=1)
+        largest_diff = np.max(np.abs(state_values - new_state_values))
+        return new_state_values, largest_diff
+
+    largest_diff = 0
+    for states in partition:
+        values = env.expected_rewards[states] + gamma * successor_values(
+            env, state_values, states)
+        new_values = np.max(values, axis=-1)
+        largest_diff = max(largest_diff,
+                           np.max(np.abs(state_values[states] - new_values)))
+        state_values[states] = new_values
+    return state_values, largest_diff
+
+
+def value_iteration(env: Env,
+                    state_values=None,
+                    discount=1.0,
+                    sweep="jacobi",
+                    threshold=1e-15,
+                    callback=None,
+                    verbose=True):
+    """
+    Applies Bellman optimality backups until the largest change in a sweep is below threshold
+    env is a gridWorld.Env or any model exposing the same arrays, such as tools.ParkingWorld
+    sweep is "jacobi" (synchronous), "gauss-seidel", "rows" or "red-black" (in-place, as in
+    policy_evaluation), rows and red-black need a grid and raise ValueError for other models
+    Returns (state_values, policy) where policy is greedy with respect to the final values
+    """
+    num_iter = 0
+    if state_values is None:
+        state_values = np.zeros(len(env.probabilities), dtype=env.dtype)
+    state_values = np.asarray(state_values, dtype=env.dtype)
+    partition = None
+    if sweep != "jacobi":
+        partition = sweep_partition(env, sweep)
+        state_values = state_values.copy()
+    while True:
+        with measuring(callback) as meter:
+            state_values, largest_diff = update_optimal_values(
+                env, state_values, discount, partition)
+            num_iter += 1
+            if meter is not None:
+                emit_record(callback, meter, "value-iteration", num_iter,
+                            largest_diff, env.expected_rewards.size)
+        if converged(largest_diff, threshold, state_values):
+            if verbose:
+                print(
+                    f"Converged with diff {largest_diff} after {num_iter} iterations."
+                )
+            break
+    policy = greedy_policy(action_values(env, state_values, discount),
+                           env.dtype)
+    return state_values, policy
+
+
+def prioritized_sweeping(env: Env,
+                         state_values=None,
+                         discount=1.0,
+                         threshold=1e-10,
+                         max_backups=None,
+                         callback=None,
+                         verbose=True):
+    """
+    Evaluates env.policy asynchronously, always backing up the state with the largest Bellman error
+    After a backup changes V(s) by more than threshold, the errors of the predecessors of s
+    (env.predecessors) are recomputed and those above threshold are queued, so settled states
+    are never touched again
+    Stops when no state has an error above threshold, or after max_backups backups
+    Every backup is a Python level step, hence the looser default threshold than the sweeping solvers
+    """
+    if state_values is None:
+        state_values = np.zeros(env.S.size, dtype=env.dtype)
+    state_values = np.array(state_values, dtype=env.dtype)
+    size = env.S.size
+    policy_rewards = np.sum(env.policy * env.expected_rewards, axis=1)
+    weights = (discount * env.policy[:, :, None] *
+               env.probabilities).reshape((size, -1))
+    successors = env.next_states.reshape((size, -1))
+    indptr, predecessors = env.predecessors
+
+    with measuring(callback) as meter:
+        errors = np.abs(
+            policy_rewards +
+            np.einsum("ij,ij->i", weights, state_values[successors]) -
+            state_values)
+        # Entries are (-error, state), an entry is stale once priority[state]
+        # moved on
+        priority = np.where(errors > threshold, errors, 0)
+        queue = [(-e, s) for s, e in enumerate(priority.tolist()) if e > 0]
+        heapq.heapify(queue)
+
+        backups = 0
+        while queue and (max_backups is None or backups < max_backups):
+            error, s = heapq.heappop(queue)
+            if -error != priority[s]:
+                continue
+            priority[s] = 0
+            new_value = policy_rewards[s] + weights[s].dot(
+                state_values[successors[s]])
+            change = abs(new_value - state_values[s])
+            state_values[s] = new_value
+            backups += 1
+            if change <= threshold:
+                continue
+            states = predecessors[indptr[s]:indptr[s + 1]]
+            errors = np.abs(
+                policy_rewards[states] +
+                np.einsum("ij,ij->i", weights[states],
+                          state_values[successors[states]]) -
+                state_values[states])
+            for p, error in zip(states.tolist(), errors.tolist()):
+                if error > threshold and error != priority[p]:
+                    priority[p] = error
+                    heapq.heappush(queue, (-error, p))
+
+        largest_diff = np.max(
+            np.abs(policy_rewards +
+                   np.einsum("ij,ij->i", weights, state_values[successors]) -
+                   state_values))
+        if meter is not None:
+            emit_record(callback, meter, "prioritized-sweeping", backups,
+                        largest_diff, backups)
+    if verbose:
+        print(f"Converged with diff {largest_diff} after {backups} backups.")
+    return state_values
+
+
+def batch_model(envs, size):
+    """
+    Stacks the model arrays of the list envs along a new leading axis of length size, a single
+    env is broadcast without copying
+    Returns take(members), which gives (next_states, probabilities, expected_rewards) of the
+    selected members, next_states is None for dense models
+    """
+    if len(envs) not in (1, size):
+        raise ValueError("Expected 1 or {} models, got {}".format(
+            size, len(envs)))
+    names = ["probabilities", "expected_rewards"]
+    if not envs[0].dense:
+        names.insert(0, "next_states")
+    if len(envs) == 1:
+        arrays = [getattr(envs[0], name) for name in names]
+
+        def take(members):
+            return [
+                np.broadcast_to(a, (len(members), ) + a.shape) for a in arrays
+            ]
+    else:
+        arrays = [np.stack([getattr(env, name) for env in envs]) for name in names]
+
+        def take(members):
+            return [a[members] for a in arrays]
+
+    if envs[0].dense:
+        return lambda members: [None] + take(members)
+    return take
+
+
+def batch_action_values(model, discounts, state_values):
+    """
+    Returns q of shape (B, S, A) for a batch of models, discounts and values of shape (B, S)
+    """
+    next_states, probabilities, expected_rewards = model
+    if next_states is None:
+        next_values = np.matmul(probabilities,
+                                state_values[:, None, :, None])[..., 0]
+    else:
+        members = np.arange(len(state_values))[:, None, None, None]
+        next_values = np.sum(probabilities *
+                             state_values[members, next_states],
+                             axis=-1)
+    return expected_rewards + discounts[:, None, None] * next_values
+
+
+def batch_solve(envs,
+                discounts,
+                policies=None,
+                state_values=None,
+                threshold=1e-15,
+                max_iterations=None,
+                verbose=True):
+    """
+    Solves B problems at once with synchronous sweeps over arrays with a leading batch axis
+    envs is one model or a list of B models with equal shapes (e.g. ParkingWorlds with different
+    price_factor), discounts is a scalar or B values, a single model or discount is shared
+    With policies of shape (S, A) or (B, S, A) the policies are evaluated, otherwise value iteration runs
+    Members that converge drop out of the sweeps
+    Returns (state_values, policies, iterations), values of shape (B, S), the greedy policies of
+    shape (B, S, A) and the number of sweeps each member needed
+    """
+    if not isinstance(envs, (list, tuple)):
+        envs = [envs]
+    discounts = np.atleast_1d(discounts)
+    size = max(len(envs), len(discounts))
+    discounts = np.broadcast_to(discounts, (size, ))
+    take = batch_model(envs, size)
+    first = envs[0]
+    # Like a Python float discount, a float32 model keeps its backups in float32
+    discounts = discounts.astype(first.dtype)
+    num_states = len(first.probabilities)
+    if policies is not None:
+        policies = np.broadcast_to(policies, (size, ) + first.expected_rewards.shape)
+    if state_values is None:
+        state_values = np.zeros((size, num_states), dtype=first.dtype)
+    state_values = np.array(np.broadcast_to(state_values,
+                                            (size, num_states)),
+                            dtype=first.dtype)
+
+    iterations = np.zeros(size, dtype=int)
+    members = np.arange(size)
+    model = take(members)
+    num_iter = 0
+    while len(members) and (max_iterations is None
+                            or num_iter < max_iterations):
+        values = batch_action_values(model, discounts[members],
+                                     state_values[members])
+        if policies is None:
+            new_values = np.max(values, axis=2)
+        else:
+            new_values = np.sum(policies[members] * values, axis=2)
+        largest_diff = np.max(np.abs(new_values - state_values[members]),
+                              axis=1)
+        state_values[members] = new_values
+        num_iter += 1
+        iterations[members] = num_iter
+        done = converged(largest_diff, threshold, new_values)
+        if done.any():
+            members = members[~done]
+            model = take(members)
+    if verbose:
+        print(f"Converged {size - len(members)} of {size} after {num_iter} iterations.")
+    greedy = greedy_policy(
+        batch_action_values(take(np.arange(size)), discounts,
+                            state_values).reshape((-1, first.expected_rewards.shape[1])),
+        first.dtype)
+    return state_values, greedy.reshape((size, ) + first.expected_rewards.shape), iterations
+
+
+if __name__ == "__main__":
+    env = Env(grid_size=(5, 6), terminal_states=[0, 29])
+    reference = policy_evaluation(env, discount=0.9, verbose=False)
+    assert np.allclose(solve_policy_values(env, 0.9, verbose=False),
+                       reference)
+    for sweep in ("gauss-seidel", "rows", "red-black"):
+        assert np.allclose(
+            policy_evaluation(env, discount=0.9, sweep=sweep, verbose=False),
+            reference)
+
+    # Prioritized sweeping stops within threshold / (1 - discount) of the fixed point
+    values = prioritized_sweeping(env, discount=0.9, threshold=1e-10,
+                                  verbose=False)
+    assert np.max(np.abs(values - reference)) < 1e-8
+    assert np.all(values[env.terminal_mask] == 0)
+
+    # Every member of a batched solve matches its own solve
+    discounts = [0.5, 0.9, 1.0]
+    batch_values, batch_policies, iterations = batch_solve(env,
+                                                           discounts,
+                                                           verbose=False)
+    for values, policy, gamma in zip(batch_values, batch_policies, discounts):
+        expected_values, expected_policy = value_iteration(env,
+                                                           discount=gamma,
+                                                           verbose=False)
+        assert np.array_equal(values, expected_values)
+        assert np.array_equal(policy, expected_policy)
+    batch_values, _, _ = batch_solve(env, 0.9, policies=env.policy,
+                                     verbose=False)
+    assert np.allclose(batch_values[0], reference)
+
+    # float32 policy iteration settles on a stable policy
+    env = Env(grid_size=(3, 7), terminal_states=[0, 20], dtype=np.float32)
+    values = policy_iteration(env, discount=0.9, verbose=False)
+    assert values.dtype == np.float32 and env.policy.dtype == np.float32
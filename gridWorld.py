@@ -1,4 +1,6 @@
 from enum import IntEnum
+import json
+import os
 import numpy as np
 
 
@@ -18,28 +20,41 @@ class Env:
     In default state, the policy table assumes each action is optimal
     """
 
-    def __init__(self, grid_size=(4, 4), terminal_states=[0, 15]):
+    # Outcomes are a padded successor list, not every state (see dp.successor_values)
+    dense = False
+
+    def __init__(self,
+                 grid_size=(4, 4),
+                 terminal_states=[0, 15],
+                 seed=None,
+                 dynamics=None,
+                 dtype=np.float64):
         self.size = grid_size
+        # Floating point type of the model, the policy and the values solved for it
+        self.dtype = np.dtype(dtype)
         self.S = np.arange(grid_size[0] * grid_size[1])
         self.TerminalStates = terminal_states
 
         self.A = Actions
-        self.R = np.array((-1, 0, -10))
+        self.__R = self._read_only(np.array((-1, 0, -10)))
 
-        self.transitions = np.zeros(
-            (len(self.S), len(self.A), len(self.S), len(self.R)))
-        self.__policy = np.zeros((len(self.S), len(self.A)))
+        self.terminal_mask = np.zeros(len(self.S), dtype=bool)
+        terminal_states = np.asarray(self.TerminalStates, dtype=np.intp)
+        # Like s in TerminalStates, entries outside the grid mark no state
+        self.terminal_mask[terminal_states[(terminal_states >= 0) & (
+            terminal_states < len(self.S))]] = True
 
-        for s in self.S:
-            for a in self.A:
-                for s_ in self.S:
-                    for r in range(len(self.R)):
-                        self.transitions[s, int(a), s_,
-                                         r] = self._initial_prob(s, s_, a, self.R[r])
+        # Sparse model: every (s, a) keeps a padded list of K outcomes, stored
+        # as next state, index into R and probability. Padding slots point back
+        # to s with probability 0, so memory grows with S * A * K instead of S^2
+        if dynamics is None:
+            dynamics = self._initial_dynamics()
+        self.set_dynamics(*dynamics)
+        self.rng = np.random.default_rng(seed)
 
-        for s in self.S:
-            for a in self.A:
-                self.__policy[s, int(a)] = 0.25
+        self.__policy = np.full((len(self.S), len(self.A)),
+                                1 / len(self.A),
+                                dtype=self.dtype)
 
     def get_state_index(self, state):
         isValidShape = len(state) == 2
@@ -53,6 +68,14 @@ class Env:
     def get_state_from_index(self, index):
         return (index // self.size[1], index % self.size[1])
 
+    def state_colors(self):
+        """
+        Two coloring of the grid, neighbouring cells never share a color
+        Returns (row + column) % 2 for every state
+        """
+        rows, cols = np.divmod(self.S, self.size[1])
+        return (rows + cols) % 2
+
     @property
     def policy(self):
         """
@@ -61,26 +84,258 @@ class Env:
         """
         return self.__policy
 
+    @property
+    def R(self):
+        """
+        The possible rewards, read only, replaced together with the model by set_dynamics
+        """
+        return self.__R
+
+    @property
+    def next_states(self):
+        return self.__next_states
+
+    @property
+    def reward_indices(self):
+        return self.__reward_indices
+
+    @property
+    def probabilities(self):
+        return self.__probabilities
+
+    def set_dynamics(self,
+                     next_states,
+                     reward_indices,
+                     probabilities,
+                     rewards=None):
+        """
+        Replaces the sparse model, arrays have shape (S, A, K), and the rewards R that
+        reward_indices point into when given
+        The arrays are stored read only so that everything compiled from them stays valid
+        """
+        if rewards is not None:
+            self.__R = self._read_only(np.array(rewards))
+        self.__next_states = self._read_only(next_states)
+        self.__reward_indices = self._read_only(reward_indices)
+        self.__probabilities = self._read_only(
+            np.asarray(probabilities, dtype=self.dtype))
+        self.__compiled = {}
+
+    @staticmethod
+    def _read_only(array):
+        view = np.asarray(array).view()
+        view.flags.writeable = False
+        return view
+
+    def _compile(self, name, build):
+        if name not in self.__compiled:
+            self.__compiled[name] = self._read_only(build())
+        return self.__compiled[name]
+
+    @property
+    def expected_rewards(self):
+        """
+        Returns r(s, a) = sum of p(s', r | s, a) * r, cached until the dynamics change
+        """
+        return self._compile(
+            "expected_rewards",
+            lambda: np.sum(self.probabilities *
+                           self.R[self.reward_indices].astype(self.dtype),
+                           axis=2))
+
+    @property
+    def deterministic(self):
+        """
+        True when every (s, a) has a single outcome with probability 1, cached until the dynamics change
+        """
+        return bool(
+            self._compile(
+                "deterministic",
+                lambda: np.all(np.max(self.probabilities, axis=2) == 1)))
+
+    @property
+    def next_state(self):
+        """
+        next_state[s, a] is the state action a from state s leads to, only for deterministic dynamics
+        """
+        return self._compile("next_state",
+                             lambda: self._certain(self.next_states))
+
+    @property
+    def reward(self):
+        """
+        reward[s, a] is the reward for taking action a from state s, only for deterministic dynamics
+        """
+        return self._compile(
+            "reward", lambda: self.R[self._certain(self.reward_indices)])
+
+    def _certain(self, outcomes):
+        # Picks the outcome with probability 1 of every (s, a)
+        if not self.deterministic:
+            raise ValueError("The dynamics are not deterministic")
+        k = np.argmax(self.probabilities, axis=2)[..., None]
+        return np.take_along_axis(outcomes, k, axis=2)[..., 0]
+
+    @property
+    def cumulative(self):
+        """
+        cumulative[s, a] is the cumulative distribution over the K outcomes of (s, a), used for sampling
+        """
+        return self._compile(
+            "cumulative", lambda: np.cumsum(self.probabilities, axis=2))
+
+    @property
+    def last_outcome(self):
+        """
+        last_outcome[s, a] is the index of the last outcome of (s, a) with non zero probability,
+        only padding follows it
+        """
+        return self._compile(
+            "last_outcome", lambda: self.probabilities.shape[2] - 1 - np.argmax(
+                self.probabilities[..., ::-1] > 0, axis=2))
+
+    @property
+    def predecessors(self):
+        """
+        Reverse transition index in CSR layout, cached until the dynamics change
+        Returns (indptr, indices), the predecessors of s' are indices[indptr[s']:indptr[s' + 1]],
+        the states from which some action reaches s' with non zero probability
+        """
+        if "predecessor_indices" not in self.__compiled:
+            size = len(self.S)
+            sources = np.broadcast_to(self.S[:, None, None],
+                                      self.next_states.shape)
+            reachable = self.probabilities > 0
+            # Sorting target * size + source groups by target and drops duplicates
+            pairs = np.unique(self.next_states[reachable] * size +
+                              sources[reachable])
+            targets, sources = np.divmod(pairs, size)
+            indptr = np.zeros(size + 1, dtype=np.intp)
+            np.cumsum(np.bincount(targets, minlength=size), out=indptr[1:])
+            self.__compiled["predecessor_indptr"] = self._read_only(indptr)
+            self.__compiled["predecessor_indices"] = self._read_only(sources)
+        return (self.__compiled["predecessor_indptr"],
+                self.__compiled["predecessor_indices"])
+
+    def save(self, path):
+        """
+        Saves the compiled model to directory path, one .npy file per array and a meta.json
+        Env.load memory maps the arrays back instead of rebuilding them
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "next_states": self.next_states,
+            "reward_indices": self.reward_indices,
+            "probabilities": self.probabilities,
+            "terminal_mask": self.terminal_mask,
+            "expected_rewards": self.expected_rewards,
+            "cumulative": self.cumulative,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), array)
+        meta = {
+            "version": 1,
+            "grid_size": [int(n) for n in self.size],
+            "terminal_states": [int(s) for s in self.TerminalStates],
+            "R": self.R.tolist(),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r", seed=None):
+        """
+        Loads a model written by Env.save
+        With the default mmap_mode the arrays are memory mapped read only, so
+        processes loading the same model share one page cached copy
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != 1:
+            raise ValueError("Unsupported model version {}".format(
+                meta["version"]))
+
+        def load_array(name):
+            return np.load(os.path.join(path, name + ".npy"),
+                           mmap_mode=mmap_mode)
+
+        dynamics = (load_array("next_states"), load_array("reward_indices"),
+                    load_array("probabilities"))
+        env = cls(tuple(meta["grid_size"]), meta["terminal_states"], seed,
+                  dynamics, dynamics[2].dtype)
+        env.set_dynamics(*dynamics, rewards=meta["R"])
+        env.terminal_mask = load_array("terminal_mask")
+        env.__compiled["expected_rewards"] = load_array("expected_rewards")
+        env.__compiled["cumulative"] = load_array("cumulative")
+        return env
+
+    def dense_transitions(self):
+        """
+        Dense model of the problem with shape (S, A, S, R)
+        Returns p(s', r | s, a) for every combination, built from the sparse model on every call
+        Memory grows with S^2, so only use it on small grids
+        """
+        dense = np.zeros((len(self.S), len(self.A), len(self.S), len(self.R)),
+                         dtype=self.dtype)
+        s, a, _ = np.indices(self.next_states.shape)
+        np.add.at(dense, (s, a, self.next_states, self.reward_indices),
+                  self.probabilities)
+        return dense
+
     def __call__(self, s, a):
         """
         Simulate taking given action from given state
         Returns (new_state, reward)
         """
-        a = int(a)
-        p = self.transitions[s, a].sum(axis=1)
-        s_ = np.random.choice(self.S, p=p)
-        r = np.random.choice(self.R, p=self.transitions[s, a, s_])
-        return (s_, r)
+        return self.step_batch(s, int(a))
 
-    def _initial_prob(self, s, s_, a, r):
+    def step_batch(self, states, actions):
         """
-        Provides the initial probability distribution for model of problem
-        Returns p(s', r | s, a) Probability that action a from state s results in state s' with reward r
+        Simulate taking actions[i] from states[i] for every i at once
+        Deterministic dynamics are a lookup and draw no random numbers
+        Returns (new_states, rewards) as arrays with the shape of states
+        """
+        states = np.asarray(states)
+        actions = np.asarray(actions)
+        if self.deterministic:
+            return self.next_state[states, actions], self.reward[states,
+                                                                 actions]
+        cumulative = self.cumulative[states, actions]
+        u = self.rng.random(states.shape)
+        k = np.sum(u[..., None] >= cumulative, axis=-1)
+        # Rounding can leave the last cumulative entry slightly below 1, the draw
+        # then falls back to the last possible outcome rather than the padding
+        k = np.minimum(k, self.last_outcome[states, actions])
+        return (self.next_states[states, actions, k],
+                self.R[self.reward_indices[states, actions, k]])
+
+    def _initial_dynamics(self):
+        """
+        Provides the initial model of problem for every state and action at once
+        Returns (next_states, reward_indices, probabilities), each with shape (S, A, 1)
+        """
+        rows, cols = np.divmod(self.S, self.size[1])
+        # Row and column offsets of each action, in the order of Actions
+        moves = np.array(((-1, 0), (1, 0), (0, -1), (0, 1)))
+        new_rows = np.clip(rows[:, None] + moves[:, 0], 0, self.size[0] - 1)
+        new_cols = np.clip(cols[:, None] + moves[:, 1], 0, self.size[1] - 1)
+        next_states = new_rows * self.size[1] + new_cols
+        reward_indices = np.full(next_states.shape, self._reward_index(-1))
+
+        next_states[self.terminal_mask] = self.S[self.terminal_mask, None]
+        reward_indices[self.terminal_mask] = self._reward_index(0)
+        probabilities = np.ones(next_states.shape, dtype=self.dtype)
+        return (next_states[..., None], reward_indices[..., None],
+                probabilities[..., None])
+
+    def _initial_successors(self, s, a):
+        """
+        Provides the initial model of problem as a sparse list of outcomes for a single (s, a)
+        Reference implementation of _initial_dynamics
+        Returns [(s', r, p(s', r | s, a))] for every outcome with non zero probability
         """
-        if r not in self.R:
-            return 0
         if s in self.TerminalStates:
-            return 1 if s == s_ and r == 0 else 0
+            return [(s, 0, 1)]
         new_reward = -1
         s = self.get_state_from_index(s)
         if a == self.A.U:
@@ -97,13 +352,28 @@ class Env:
             new_state = (s[0], new_col)
         else:
             raise NotImplementedError
-        new_state = self.get_state_index(new_state)
-        if s_ == new_state and r == new_reward:
-            return 1
+        return [(self.get_state_index(new_state), new_reward, 1)]
+
+    def _initial_prob(self, s, s_, a, r):
+        """
+        Provides the initial probability distribution for model of problem
+        Returns p(s', r | s, a) Probability that action a from state s results in state s' with reward r
+        """
+        if r not in self.R:
+            return 0
+        for new_state, new_reward, p in self._initial_successors(s, a):
+            if s_ == new_state and r == new_reward:
+                return p
         return 0
 
+    def _reward_index(self, r):
+        return np.where(self.R == r)[0][0]
+
     def prob(self, s_, r, s, a):
-        return self.transitions[s, int(a), s_, np.where(self.R == r)[0][0]]
+        a = int(a)
+        outcomes = ((self.next_states[s, a] == s_) &
+                    (self.reward_indices[s, a] == self._reward_index(r)))
+        return self.probabilities[s, a][outcomes].sum()
 
 
 if __name__ == "__main__":
@@ -158,6 +428,12 @@ if __name__ == "__main__":
     assert np.array_equal(env(env.get_state_index((3, 3)), env.A.D),
                           (env.get_state_index((3, 3)), -1))
 
+    indptr, predecessors = env.predecessors
+    for state in env.S:
+        expected = {s for s in env.S for a in env.A
+                    if any(env.prob(state, r, s, a) > 0 for r in env.R)}
+        assert set(predecessors[indptr[state]:indptr[state + 1]]) == expected
+
     env = Env(terminal_states=[0, 15])
     assert np.array_equal(env(env.get_state_index((3, 3)), env.A.L),
                           (env.get_state_index((3, 3)), 0))
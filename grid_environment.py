@@ -0,0 +1,134 @@
+import bisect
+import numpy as np
+import gridWorld as gw
+from Files.rlglue.environment import BaseEnvironment, BaseBatchEnvironment
+
+
+def make_env(env_info):
+    """
+    Returns env_info["env"] if given, otherwise a gridWorld.Env built from the grid_size,
+    terminal_states and seed entries of env_info
+    """
+    if "env" in env_info:
+        return env_info["env"]
+    return gw.Env(env_info.get("grid_size", (4, 4)),
+                  env_info.get("terminal_states", [0, 15]),
+                  seed=env_info.get("seed"))
+
+
+class GridWorldEnvironment(BaseEnvironment):
+    """
+    RLGlue environment stepping a gridWorld.Env
+    The model arrays are copied into nested lists once, which index faster than arrays one
+    element at a time
+    Deterministic dynamics are a single lookup, otherwise each (s, a) draws from a block of
+    uniform numbers refilled every random_block steps, unless one outcome is certain
+    env_info may hold env (a gridWorld.Env) or grid_size, terminal_states and seed, and
+    start_state, a random non terminal state every episode by default
+    """
+
+    random_block = 4096
+
+    def env_init(self, env_info={}):
+        self.env = make_env(env_info)
+        self.rng = np.random.default_rng(env_info.get("seed"))
+        self.start_state = env_info.get("start_state")
+        self.start_states = np.flatnonzero(~self.env.terminal_mask)
+
+        self.terminal = self.env.terminal_mask.tolist()
+        if self.env.deterministic:
+            self.next_states = self.env.next_state.tolist()
+            self.rewards = self.env.reward.astype(float).tolist()
+            self.cumulative = None
+        else:
+            self.next_states = self.env.next_states.tolist()
+            self.rewards = self.env.R[self.env.reward_indices].astype(
+                float).tolist()
+            self.cumulative = self.env.cumulative.tolist()
+            self.last_outcome = self.env.last_outcome.tolist()
+
+        self.uniform = []
+        self.uniform_index = 0
+        self.state = None
+        self.reward_obs_term = (0.0, None, False)
+
+    def env_start(self):
+        if self.start_state is None:
+            self.state = int(self.rng.choice(self.start_states))
+        else:
+            self.state = self.start_state
+        self.reward_obs_term = (0.0, self.state, False)
+        return self.state
+
+    def env_step(self, action):
+        next_state = self.next_states[self.state][action]
+        reward = self.rewards[self.state][action]
+        if self.cumulative is not None:
+            cumulative = self.cumulative[self.state][action]
+            if cumulative[0] == 1:
+                k = 0
+            else:
+                if self.uniform_index == len(self.uniform):
+                    self.uniform = self.rng.random(self.random_block).tolist()
+                    self.uniform_index = 0
+                u = self.uniform[self.uniform_index]
+                self.uniform_index += 1
+                # Rounding can leave the last cumulative entry slightly below 1, the draw
+                # then falls back to the last possible outcome rather than the padding
+                k = min(bisect.bisect_right(cumulative, u),
+                        self.last_outcome[self.state][action])
+            next_state = next_state[k]
+            reward = reward[k]
+        self.reward_obs_term = (reward, next_state, self.terminal[next_state])
+        self.state = next_state
+        return self.reward_obs_term
+
+    def env_cleanup(self):
+        pass
+
+    def env_message(self, message):
+        if message == "env":
+            return self.env
+        return None
+
+
+class GridWorldBatchEnvironment(BaseBatchEnvironment):
+    """
+    BaseBatchEnvironment of env_info["num_envs"] copies of a gridWorld.Env, stepped with
+    Env.step_batch, see GridWorldEnvironment for the other entries of env_info
+    """
+
+    def env_init(self, env_info={}):
+        self.env = make_env(env_info)
+        self.num_envs = env_info["num_envs"]
+        self.rng = np.random.default_rng(env_info.get("seed"))
+        self.start_state = env_info.get("start_state")
+        self.start_states = np.flatnonzero(~self.env.terminal_mask)
+        self.states = np.zeros(self.num_envs, dtype=np.intp)
+
+    def start_states_for(self, count):
+        if self.start_state is None:
+            return self.rng.choice(self.start_states, size=count)
+        return np.full(count, self.start_state)
+
+    def env_start(self):
+        self.states[:] = self.start_states_for(self.num_envs)
+        return self.states.copy()
+
+    def env_step(self, actions):
+        next_states, rewards = self.env.step_batch(self.states, actions)
+        self.states[:] = next_states
+        return rewards, next_states, self.env.terminal_mask[next_states]
+
+    def env_reset(self, mask):
+        starts = self.start_states_for(np.count_nonzero(mask))
+        self.states[mask] = starts
+        return starts
+
+    def env_cleanup(self):
+        pass
+
+    def env_message(self, message):
+        if message == "env":
+            return self.env
+        return None
@@ -1,14 +1,10 @@
 import numpy as np
 import gridWorld as gw
-from dp import policy_evaluation, policy_improvement
+from dp import policy_iteration
 
 env = gw.Env()
 
-stable = False
-state_values = None
-while not stable:
-    state_values = policy_evaluation(env, state_values)
-    stable = policy_improvement(env, state_values)
+state_values = policy_iteration(env)
 
 for state in env.S:
     print("For state {}, {}".format(state, state_values[state]))
@@ -0,0 +1,233 @@
+import sys
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+from gridWorld import Env
+from dp import greedy_policy, action_values, converged
+
+# Seconds a worker waits at the barrier for the others to finish a sweep before giving up
+BARRIER_TIMEOUT = 3600
+
+
+def share(arrays):
+    """
+    Copies every array into its own shared memory block
+    Returns (blocks, specs, views), specs maps name to (block name, shape, dtype) for attach
+    and views maps name to the shared copy
+    """
+    blocks, specs, views = [], {}, {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(array.nbytes, 1))
+        views[name] = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+        views[name][...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs, views
+
+
+def attach(specs):
+    """
+    Maps the arrays described by specs from share without copying them
+    Returns (blocks, arrays), keep blocks alive while the arrays are used
+    """
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+    return blocks, arrays
+
+
+def sweeps(arrays, mode, gamma, start, end, worker, barrier, threshold,
+           max_iterations):
+    """
+    Updates states [start, end) every sweep, reading the values of the previous sweep
+    Values and residuals are double buffered by sweep parity, so one barrier per sweep is enough
+    Returns (num_iter, largest_diff)
+    """
+    values, residuals = arrays["values"], arrays["residuals"]
+    num_iter = 0
+    while True:
+        old_values = values[num_iter % 2]
+        if mode == "evaluation":
+            new_values = arrays["policy_rewards"][start:end] + np.einsum(
+                "ij,ij->i", arrays["weights"][start:end],
+                old_values[arrays["successors"][start:end]])
+        else:
+            if "next_states" in arrays:
+                next_values = np.sum(
+                    arrays["probabilities"][start:end] *
+                    old_values[arrays["next_states"][start:end]],
+                    axis=-1)
+            else:
+                next_values = arrays["probabilities"][start:end] @ old_values
+            new_values = np.max(arrays["expected_rewards"][start:end] +
+                                gamma * next_values,
+                                axis=1)
+        values[(num_iter + 1) % 2, start:end] = new_values
+        residuals[num_iter % 2, worker] = np.max(
+            np.abs(new_values - old_values[start:end]), initial=0)
+        barrier.wait(BARRIER_TIMEOUT)
+        num_iter += 1
+        largest_diff = np.max(residuals[(num_iter - 1) % 2])
+        if converged(largest_diff, threshold, values[num_iter % 2]) or (
+                max_iterations is not None and num_iter >= max_iterations):
+            return num_iter, largest_diff
+
+
+def sweep_worker(specs, mode, gamma, start, end, worker, barrier, threshold,
+                 max_iterations):
+    """
+    Runs sweeps in a worker process on the shared arrays described by specs
+    Any failure aborts the barrier, so the other workers stop instead of waiting for this one
+    """
+    blocks, arrays = attach(specs)
+    try:
+        num_iter, largest_diff = sweeps(arrays, mode, gamma, start, end,
+                                        worker, barrier, threshold,
+                                        max_iterations)
+        if worker == 0:
+            arrays["status"][:] = (num_iter, largest_diff)
+    except threading.BrokenBarrierError:
+        # Another worker failed and reports the error
+        sys.exit(1)
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def parallel_sweeps(arrays, mode, num_states, gamma, state_values, threshold,
+                    processes, max_iterations):
+    """
+    Runs synchronous sweeps over blocks of states in a pool of processes
+    The model and both value buffers live in shared memory, nothing is pickled per sweep
+    Returns (state_values, num_iter, largest_diff)
+    """
+    if processes is None:
+        processes = mp.cpu_count()
+    processes = max(1, min(processes, num_states))
+    values = np.zeros((2, num_states), dtype=state_values.dtype)
+    values[0] = state_values
+    arrays = dict(arrays,
+                  values=values,
+                  residuals=np.zeros((2, processes)),
+                  status=np.zeros(2))
+    blocks, specs, views = share(arrays)
+    try:
+        barrier = mp.Barrier(processes)
+        bounds = np.linspace(0, num_states, processes + 1).astype(int)
+        workers = [
+            mp.Process(target=sweep_worker,
+                       args=(specs, mode, gamma, bounds[w], bounds[w + 1], w,
+                             barrier, threshold, max_iterations))
+            for w in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        # A worker killed before reaching the barrier cannot abort it, so abort it here
+        running = {worker.sentinel: worker for worker in workers}
+        while running:
+            for sentinel in wait(list(running)):
+                worker = running.pop(sentinel)
+                worker.join()
+                if worker.exitcode != 0:
+                    barrier.abort()
+        if any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("A sweep worker failed")
+        num_iter, largest_diff = views["status"]
+        state_values = views["values"][int(num_iter) % 2].copy()
+    finally:
+        del views
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return state_values, int(num_iter), largest_diff
+
+
+def parallel_policy_evaluation(env: Env,
+                               state_values=None,
+                               discount=1.0,
+                               threshold=1e-15,
+                               processes=None,
+                               max_iterations=None,
+                               verbose=True):
+    """
+    Synchronous policy evaluation of env.policy with the states split across processes
+    Converges to the same values as dp.policy_evaluation with sweep="jacobi"
+    """
+    if state_values is None:
+        state_values = np.zeros(env.S.size)
+    state_values = np.asarray(state_values, dtype=env.dtype)
+    size = env.S.size
+    arrays = {
+        "policy_rewards": np.sum(env.policy * env.expected_rewards, axis=1),
+        "weights": (discount * env.policy[:, :, None] *
+                    env.probabilities).reshape((size, -1)),
+        "successors": env.next_states.reshape((size, -1)),
+    }
+    state_values, num_iter, largest_diff = parallel_sweeps(
+        arrays, "evaluation", size, discount, state_values, threshold,
+        processes, max_iterations)
+    if verbose:
+        print(f"Converged with diff {largest_diff} after {num_iter} iterations.")
+    return state_values
+
+
+def parallel_value_iteration(env: Env,
+                             state_values=None,
+                             discount=1.0,
+                             threshold=1e-15,
+                             processes=None,
+                             max_iterations=None,
+                             verbose=True):
+    """
+    Synchronous value iteration with the states split across processes
+    env is a gridWorld.Env or any model exposing the same arrays, such as tools.ParkingWorld
+    Returns (state_values, policy) like dp.value_iteration
+    """
+    size = len(env.probabilities)
+    if state_values is None:
+        state_values = np.zeros(size)
+    state_values = np.asarray(state_values, dtype=env.dtype)
+    arrays = {
+        "expected_rewards": env.expected_rewards,
+        "probabilities": env.probabilities,
+    }
+    if not env.dense:
+        arrays["next_states"] = env.next_states
+    state_values, num_iter, largest_diff = parallel_sweeps(
+        arrays, "optimality", size, discount, state_values, threshold,
+        processes, max_iterations)
+    if verbose:
+        print(f"Converged with diff {largest_diff} after {num_iter} iterations.")
+    policy = greedy_policy(action_values(env, state_values, discount),
+                           env.dtype)
+    return state_values, policy
+
+
+if __name__ == "__main__":
+    from dp import policy_evaluation, value_iteration
+
+    env = Env(grid_size=(6, 5), terminal_states=[0, 29])
+    for processes in (1, 3):
+        values = parallel_policy_evaluation(env, discount=0.9,
+                                            processes=processes,
+                                            verbose=False)
+        assert np.allclose(values,
+                           policy_evaluation(env, discount=0.9,
+                                             verbose=False))
+        values, policy = parallel_value_iteration(env, discount=0.9,
+                                                  processes=processes,
+                                                  verbose=False)
+        expected_values, expected_policy = value_iteration(env, discount=0.9,
+                                                           verbose=False)
+        assert np.allclose(values, expected_values)
+        assert np.array_equal(policy, expected_policy)